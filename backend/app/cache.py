@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# --- TIERED RESULT CACHE ---
+# Tier 1: per-process LRU, bounded by a byte budget and a TTL.
+# Tier 2: SQLite file (WAL mode) on local disk, shared by every uvicorn worker
+#         and kept across restarts.
+
+CACHE_PATH = os.getenv(
+    "EVIDENTIA_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "evidentia.sqlite"),
+)
+CACHE_MAX_BYTES = int(os.getenv("EVIDENTIA_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("EVIDENTIA_CACHE_TTL", str(7 * 24 * 3600)))
+# Expired rows (and rows under old fingerprints, once they expire) are deleted
+# every CACHE_MAINTENANCE_SECONDS; the newest rows are kept up to this size.
+CACHE_DISK_MAX_BYTES = int(os.getenv("EVIDENTIA_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+CACHE_MAINTENANCE_SECONDS = float(os.getenv("EVIDENTIA_CACHE_MAINTENANCE", "600"))
+
+
+def open_sqlite(path: str) -> sqlite3.Connection:
+    """Open a connection that can be shared across threads and processes."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class MemoryLRU:
+    """LRU of serialized values with a total byte budget and per-entry expiry."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()  # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                self._drop(key)
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload: str, expires_at: float = None):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (expires_at or time.time() + self.ttl, payload)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._data:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _drop(self, key):
+        _, payload = self._data.pop(key)
+        self.bytes -= len(payload)
+
+
+class DiskStore:
+    """Key/value table with expiry in a SQLite database."""
+
+    def __init__(self, path: str, table: str = "results"):
+        self.path = path
+        self.table = table
+        self._conn = open_sqlite(path)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return row  # (value, expires) or None
+
+    def set(self, key, payload: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, expires) VALUES (?, ?, ?, ?)",
+                (key, payload, time.time(), expires_at),
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def items(self) -> list:
+        """Every unexpired row as (key, value, expires)."""
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT key, value, expires FROM {self.table} WHERE expires > ?", (time.time(),)
+            ).fetchall()
+
+    def replace_many(self, rows: list, old_keys: list):
+        """Write (key, value, expires) rows and drop `old_keys` in one transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, created, expires) VALUES (?, ?, ?, ?)",
+                    [(key, value, now, expires) for key, value, expires in rows],
+                )
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k in old_keys])
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (time.time(),))
+        return cur.rowcount
+
+    def trim(self, max_bytes: int) -> int:
+        """Delete the oldest rows until the stored values fit in `max_bytes`."""
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM (SELECT key, SUM(length(value)) OVER (ORDER BY created DESC, key) AS kept "
+                f"FROM {self.table}) WHERE kept > ?)",
+                (max_bytes,),
+            )
+        return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class ResultCache:
+    """Memory LRU in front of a shared on-disk store. Values are JSON-serializable dicts."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL_SECONDS,
+                 table: str = "results", disk_max_bytes: int = CACHE_DISK_MAX_BYTES):
+        self.ttl = ttl
+        self.disk_max_bytes = disk_max_bytes
+        self._last_maintenance = time.monotonic()
+        self.purged = 0
+        self.memory = MemoryLRU(max_bytes, ttl)
+        self.disk = None
+        if path:
+            try:
+                self.disk = DiskStore(path, table)
+            except sqlite3.Error as e:
+                print(f"⚠️ Warning: Disk cache unavailable ({e}), using memory only.", flush=True)
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def get(self, key):
+        payload = self.memory.get(key)
+        if payload is not None:
+            self.hits_memory += 1
+            return json.loads(payload)
+
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                payload, expires_at = row
+                if expires_at > time.time():
+                    self.hits_disk += 1
+                    self.memory.set(key, payload, expires_at)
+                    return json.loads(payload)
+                self.disk.delete(key)
+                self.memory.expirations += 1
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value: dict, ttl: float = None):
+        payload = json.dumps(value, separators=(",", ":"))
+        expires_at = time.time() + (ttl or self.ttl)
+        self.memory.set(key, payload, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, payload, expires_at)
+            self._maybe_maintain()
+
+    def _maybe_maintain(self):
+        now = time.monotonic()
+        if now - self._last_maintenance > CACHE_MAINTENANCE_SECONDS:
+            self._last_maintenance = now
+            self.maintain()
+
+    def maintain(self) -> int:
+        """Drop expired rows, then the oldest ones past the disk budget. Returns rows deleted."""
+        if self.disk is None:
+            return 0
+        deleted = self.disk.purge_expired() + self.disk.trim(self.disk_max_bytes)
+        self.purged += deleted
+        return deleted
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits": self.hits_memory + self.hits_disk,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "disk_entries": self.disk.count() if self.disk is not None else 0,
+            "disk_purged": self.purged,
+            "disk_path": self.disk.path if self.disk is not None else None,
+        }
@@ -0,0 +1,74 @@
+import re
+
+# --- SECTION-AWARE CHUNKER ---
+# Splits cleaned policy text into chunks that fit the prompt limit, breaking on
+# section headings and paragraph boundaries instead of mid-clause.
+
+HEADING_RE = re.compile(
+    r"^\s*(?:(?:section|article|part)\s+[\divxlc]+\b|\d+(?:\.\d+)*[.)]?\s+\S)",
+    re.IGNORECASE,
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+
+
+def is_heading(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped or len(stripped) > 100:
+        return False
+    if stripped.isupper():
+        return True
+    return bool(HEADING_RE.match(stripped)) and not stripped.endswith((".", ",", ";"))
+
+
+def split_long_paragraph(paragraph: str, max_chars: int):
+    """Break one paragraph that is longer than a chunk: sentences first, then hard cuts."""
+    pieces, current = [], ""
+    for sentence in SENTENCE_END_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_chars: int, section_fill: float = 0.6) -> list:
+    """
+    Greedily pack paragraphs into chunks of at most `max_chars`.
+    Once a chunk is `section_fill` full, a new section heading starts a new chunk
+    so related clauses stay together.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks, current, size = [], [], 0
+
+    def flush():
+        nonlocal current, size
+        if current:
+            chunks.append("\n".join(current))
+        current, size = [], 0
+
+    for paragraph in text.split("\n"):
+        if not paragraph.strip():
+            continue
+        if len(paragraph) > max_chars:
+            flush()
+            chunks.extend(split_long_paragraph(paragraph, max_chars))
+            continue
+        if size and is_heading(paragraph) and size >= max_chars * section_fill:
+            flush()
+        if size + len(paragraph) + 1 > max_chars:
+            flush()
+        current.append(paragraph)
+        size += len(paragraph) + 1
+
+    flush()
+    return chunks
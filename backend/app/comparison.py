@@ -0,0 +1,68 @@
+import numpy as np
+
+from flags import FLAG_IDS, FLAG_CATEGORY
+from score import CATEGORIES, TRUE, FindingsMatrix
+
+# --- N-WAY COMPARISON ---
+# Generalizes compare()'s common/unique split to any number of policies. Every
+# report is one row of a FindingsMatrix, so the presence matrix, common risks
+# and unique risks are column reductions: O(N x flags), never O(N^2) pairs.
+
+
+def partition_risks(findings_lists: list):
+    """
+    (common, unique) over N findings lists. `common` holds the risks present in
+    every list (findings taken from the first); unique[i] the risks only list i has.
+    """
+    presence = FindingsMatrix.from_findings(findings_lists).status == TRUE
+    counts = presence.sum(axis=0)
+    everywhere = presence.all(axis=0) if len(findings_lists) else np.zeros(len(FLAG_IDS), dtype=bool)
+
+    by_flag = [{f["flag"]: f for f in findings if f.get("status") == "true"} for findings in findings_lists]
+    common = [by_flag[0][FLAG_IDS[col]] for col in np.flatnonzero(everywhere)] if findings_lists else []
+    unique = [
+        [by_flag[row][FLAG_IDS[col]] for col in np.flatnonzero(presence[row] & (counts == 1))]
+        for row in range(len(findings_lists))
+    ]
+    return common, unique, presence
+
+
+def build_comparison(labels: list, reports: list) -> dict:
+    """Ranking, flag x policy matrix, category table and common/unique risks for N reports."""
+    common, unique, presence = partition_risks([r["findings"] for r in reports])
+    scores = [r["overall_score"] for r in reports]
+
+    ranking = []
+    for position, index in enumerate(sorted(range(len(reports)), key=lambda i: (scores[i], i))):
+        tied = ranking and ranking[-1]["overall_score"] == scores[index]
+        ranking.append({
+            "rank": ranking[-1]["rank"] if tied else position + 1,
+            "index": index,
+            "label": labels[index],
+            "overall_score": scores[index],
+            "risk_count": int(presence[index].sum()),
+        })
+
+    flagged = np.flatnonzero(presence.any(axis=0))
+    label_of = {f["flag"]: f["label"] for r in reports for f in r["findings"]}
+    matrix = [
+        {
+            "flag": FLAG_IDS[col],
+            "label": label_of.get(FLAG_IDS[col], FLAG_IDS[col]),
+            "category": FLAG_CATEGORY[FLAG_IDS[col]],
+            "present": presence[:, col].tolist(),
+            "count": int(presence[:, col].sum()),
+        }
+        for col in flagged
+    ]
+
+    return {
+        "ranking": ranking,
+        "matrix": {"policies": labels, "flags": matrix},
+        "category_scores": {
+            "policies": labels,
+            "categories": {c: [r["category_scores"].get(c, 0) for r in reports] for c in CATEGORIES},
+        },
+        "common_risks": common,
+        "unique_risks": [{"index": i, "label": labels[i], "risks": risks} for i, risks in enumerate(unique)],
+    }
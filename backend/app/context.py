@@ -0,0 +1,135 @@
+import re
+import math
+from collections import Counter
+
+from chunking import split_long_paragraph
+
+# --- RELEVANCE-RANKED CONTEXT PACKING ---
+# Instead of sending the head of a long document, rank its paragraphs with BM25
+# against a query per flag and pack the best ones into a token budget.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+CHARS_PER_TOKEN = 4  # rough estimate for English legal text
+MAX_PARAGRAPH_CHARS = 2000
+STOPWORDS = frozenset(
+    "a an and are as at be by data does for from has have if in is it its mentions no not of on or "
+    "our said says that the their this to use user users uses we with you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
+
+def query_tokens(*texts) -> list:
+    """Distinct, non-stopword tokens from free text and/or guardrail regexes."""
+    tokens = []
+    for text in texts:
+        for token in tokenize(re.sub(r"\\[a-z]|[^A-Za-z0-9 ]", " ", text)):
+            if len(token) > 1 and token not in STOPWORDS and token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def split_paragraphs(text: str) -> list:
+    paragraphs = []
+    for line in text.split("\n"):
+        if not line.strip():
+            continue
+        if len(line) > MAX_PARAGRAPH_CHARS:
+            paragraphs.extend(split_long_paragraph(line, MAX_PARAGRAPH_CHARS))
+        else:
+            paragraphs.append(line)
+    return paragraphs
+
+
+class ParagraphIndex:
+    """Okapi BM25 over a document's paragraphs, with an inverted index for lookups."""
+
+    def __init__(self, paragraphs: list, k1: float = 1.5, b: float = 0.75):
+        self.paragraphs = paragraphs
+        self.k1 = k1
+        self.b = b
+        self.lengths = []
+        self.postings = {}  # term -> [(paragraph index, term frequency)]
+        for i, paragraph in enumerate(paragraphs):
+            counts = Counter(tokenize(paragraph))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def idf(self, term: str) -> float:
+        n = len(self.paragraphs)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, tokens: list) -> dict:
+        """Scores for paragraphs matching at least one token: {paragraph index: score}."""
+        scores = {}
+        for term in tokens:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+def select_context(text: str, queries: dict, token_budget: int) -> tuple:
+    """
+    Pack the paragraphs most relevant to `queries` ({flag_id: tokens}) into
+    `token_budget`. Every flag first gets its best paragraph, then the rest are
+    filled by combined relevance. Kept paragraphs stay in document order.
+    Returns (packed text, report).
+    """
+    char_budget = token_budget * CHARS_PER_TOKEN
+    paragraphs = split_paragraphs(text)
+    report = {
+        "strategy": "ranked",
+        "token_budget": token_budget,
+        "paragraphs_total": len(paragraphs),
+        "chars_total": len(text),
+    }
+    if len(text) <= char_budget:
+        report.update(paragraphs_kept=len(paragraphs), chars_kept=len(text), kept_ratio=1.0)
+        return text, report
+
+    index = ParagraphIndex(paragraphs)
+    per_flag = {flag_id: index.score(tokens) for flag_id, tokens in queries.items()}
+
+    # Best paragraph per flag first (strongest first), then overall relevance,
+    # normalizing each flag's scores so no single flag dominates the ranking.
+    order = []
+    firsts = sorted(
+        ((max(scores.values()), max(scores, key=scores.get)) for scores in per_flag.values() if scores),
+        reverse=True,
+    )
+    order.extend(i for _, i in firsts)
+    combined = Counter()
+    for scores in per_flag.values():
+        if scores:
+            top = max(scores.values())
+            for i, value in scores.items():
+                combined[i] += value / top
+    order.extend(i for i, _ in combined.most_common())
+
+    kept, used = set(), 0
+    for i in order:
+        if i in kept:
+            continue
+        size = len(paragraphs[i]) + 1
+        if used + size > char_budget:
+            continue
+        kept.add(i)
+        used += size
+
+    packed = "\n".join(paragraphs[i] for i in sorted(kept))
+    report.update(
+        paragraphs_kept=len(kept),
+        chars_kept=len(packed),
+        kept_ratio=round(len(packed) / len(text), 3) if text else 1.0,
+    )
+    return packed, report
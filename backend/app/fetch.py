@@ -0,0 +1,161 @@
+import os
+import asyncio
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import httpx
+from fastapi import HTTPException
+
+from cache import CACHE_PATH, ResultCache
+from metrics import ERRORS, span
+from singleflight import SingleFlight
+
+# --- YELLOWCAKE CONFIG ---
+YELLOWCAKE_API_KEY = os.getenv("YELLOWCAKE_API_KEY")
+# Point at a local stub (see stub_yellowcake.py) to develop or test without scraping.
+YELLOWCAKE_URL = os.getenv("YELLOWCAKE_URL", "https://api.yellowcake.dev/v1/extract")
+
+# --- FETCH CACHE ---
+# Scraped text is cached on disk by normalized URL, so re-analyzing or comparing
+# a known policy skips the (slow) scrape. Blocked sites (Yellowcake reached the
+# page but got nothing usable) are remembered for a shorter time so we don't keep
+# hammering them; Yellowcake's own failures (auth, quota, errors) are never cached.
+FETCH_CACHE_TTL = int(os.getenv("EVIDENTIA_FETCH_CACHE_TTL", str(24 * 3600)))
+FETCH_NEGATIVE_TTL = int(os.getenv("EVIDENTIA_FETCH_NEGATIVE_TTL", str(15 * 60)))
+FETCH_CACHE_MAX_BYTES = int(os.getenv("EVIDENTIA_FETCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+MIN_POLICY_CHARS = 200
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+# --- POOLED HTTP CLIENT ---
+# One keep-alive connection pool per worker instead of a fresh connection per scrape.
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+http_client: Optional[httpx.AsyncClient] = None
+
+FETCH_CACHE = ResultCache(CACHE_PATH, max_bytes=FETCH_CACHE_MAX_BYTES, ttl=FETCH_CACHE_TTL, table="fetches")
+# Concurrent requests for the same URL share one scrape.
+FETCH_FLIGHTS = SingleFlight("fetch")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(timeout=30, limits=HTTP_LIMITS)
+    return http_client
+
+
+async def close_http_client():
+    if http_client is not None:
+        await http_client.aclose()
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used as the cache key: same page, same key."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    port = parts.port
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    # http and https serve the same policy; the fragment never reaches the server
+    return urlunsplit(("https" if scheme in ("http", "https") else scheme, host, path, urlencode(query), ""))
+
+
+class SiteProtected(Exception):
+    """Yellowcake answered, but the page could not be scraped (blocked or empty)."""
+
+
+SCRAPER_AUTH_STATUSES = (401, 402, 403, 407)  # our Yellowcake key or quota, not the target site
+
+
+async def fetch_from_yellowcake(target_url: str) -> str:
+    if not YELLOWCAKE_API_KEY:
+        print("⚠️ Warning: No Yellowcake API Key found.", flush=True)
+        ERRORS.inc(type="scraper_unavailable")
+        raise HTTPException(status_code=400, detail="Error: Scraper API Key missing.")
+
+    print(f"🍰 Calling Yellowcake for: {target_url}", flush=True)
+
+    headers = {
+        "x-api-key": YELLOWCAKE_API_KEY,
+        "Content-Type": "application/json"
+    }
+
+    payload = {
+        "url": target_url,
+        "prompt": "privacy policy"
+    }
+
+    try:
+        response = await get_http_client().post(YELLOWCAKE_URL, json=payload, headers=headers)
+    except Exception as e:
+        print(f"❌ Yellowcake Error: {str(e)}", flush=True)
+        ERRORS.inc(type="scrape_failed")
+        raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
+
+    print(f"✅ Yellowcake Status: {response.status_code}", flush=True)
+    if response.status_code in SCRAPER_AUTH_STATUSES:
+        # A bad or expired key would otherwise look like every site being blocked.
+        print(f"❌ Yellowcake rejected our API key ({response.status_code})", flush=True)
+        ERRORS.inc(type="scraper_auth")
+        raise HTTPException(
+            status_code=502, detail=f"Error: Scraper authentication failed (Yellowcake returned {response.status_code})."
+        )
+    if response.status_code != 200:
+        # A status alone doesn't tell a blocked site from a failing scraper: don't remember it.
+        ERRORS.inc(type="scrape_failed")
+        raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
+
+    try:
+        data = response.json()
+    except ValueError:
+        ERRORS.inc(type="scrape_failed")
+        raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
+    text = data.get("text") or data.get("content") or data.get("data") or ""
+
+    # PROTECT AGAINST BLOCKS: If the text is too short, it's a failed scrape
+    if len(str(text).strip()) < MIN_POLICY_CHARS:
+        print(f"⚠️ Scraping failed: Text too short ({len(str(text))} chars)", flush=True)
+        raise SiteProtected("text too short")
+
+    print(f"📄 Extracted {len(text)} chars from URL.", flush=True)
+    return str(text)
+
+
+async def fetch_policy_text(url: str, refresh: bool = False) -> str:
+    """
+    Policy text for `url`, from the fetch cache when possible. `refresh` skips the
+    cache (including a remembered block) and stores the new result.
+    """
+    key = normalize_url(url)
+    if not refresh:
+        with span("fetch_cache"):
+            cached = await asyncio.to_thread(FETCH_CACHE.get, key)  # SQLite read, off the event loop
+        if cached is not None:
+            if cached.get("error"):
+                ERRORS.inc(type="site_protected_cached")
+                print(f"🚫 Fetch cache: {key} was blocked recently, not retrying.", flush=True)
+                raise HTTPException(status_code=400, detail=f"Error: {cached['error']}")
+            print(f"⚡ Fetch cache hit: {key}", flush=True)
+            return cached["text"]
+
+    async def fetch():
+        try:
+            with span("scrape"):
+                text = await fetch_from_yellowcake(url)
+        except SiteProtected as e:
+            ERRORS.inc(type="site_protected")
+            print(f"⚠️ Remembering {key} as protected ({e}) for {FETCH_NEGATIVE_TTL}s", flush=True)
+            await asyncio.to_thread(FETCH_CACHE.set, key, {"error": "SITE_PROTECTED"}, ttl=FETCH_NEGATIVE_TTL)
+            raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
+        await asyncio.to_thread(FETCH_CACHE.set, key, {"text": text})
+        return text
+
+    return await FETCH_FLIGHTS.do(key, fetch)
+
@@ -45,4 +45,9 @@ FLAGS = {
         "forced_disclosure_of_data": "Forced disclosure of user data",
         "life_control_technology": "Takes control of your life via advanced tech",
     },
-}
\ No newline at end of file
+}
+
+# Stable flag order (FLAGS order): bit positions, matrix columns.
+FLAG_IDS = [flag_id for items in FLAGS.values() for flag_id in items]
+FLAG_INDEX = {flag_id: i for i, flag_id in enumerate(FLAG_IDS)}
+FLAG_CATEGORY = {flag_id: category for category, items in FLAGS.items() for flag_id in items}
@@ -0,0 +1,160 @@
+import re
+from flags import FLAG_INDEX as FLAGS_INDEX
+
+# --- LAYER 2: REGEX GUARDRAILS ---
+# If these keywords are NOT present, the flag is FORCED to False.
+GUARDRAILS = {
+    "sells_user_data": [r"sell", r"sold", r"rent", r"monetary", r"consideration", r"exchange"],
+    "collects_biometrics": [r"biometric", r"face", r"facial", r"fingerprint", r"voice", r"retina", r"iris"],
+    "shares_health_data": [r"health", r"medical", r"treatment", r"doctor", r"hospital", r"patient"],
+    "waives_rights": [r"class action", r"jury", r"arbitration", r"waive", r"dispute"],
+    "shares_with_data_brokers": [r"broker", r"aggregator", r"syndicate", r"cooperative"],
+    "uses_cross_site_tracking": [r"track", r"cross-site", r"third-party cookie", r"pixel", r"beacon", r"replay"],
+}
+
+# --- SCHEMA PRUNING VOCABULARIES ---
+# Pruning only, never forced-false: a flag whose topic never comes up is left out
+# of the LLM schema (see llm.select_candidate_flags). Lists favour recall - a
+# miss here silently answers "not present". Flags about something being ABSENT
+# (no_*, denies_*) are never listed. Word boundaries go after the literal
+# ("dob\b(?<!\wdob)"): `re` only uses its fast substring search when a pattern
+# starts with one.
+TOPIC_VOCABULARY = {
+    "uses_cookies": [r"cookie", r"pixel", r"beacon", r"tracking", r"tracker", r"similar technolog", r"local storage", r"web storage", r"sdk", r"tag", r"gif", r"analytics"],
+    "collects_ip_address": [r"\bips?\b", r"ipv[46]\b(?<!\wipv.)", r"internet protocol", r"ip-address", r"network address"],
+    "collects_email_address": [r"mail", r"contact (?:info|detail)", r"newsletter"],
+    "collects_birthday": [r"birth", r"ages?\b(?<!\wage)(?<!\wages)", r"dob\b(?<!\wdob)", r"years old", r"years of age", r"how old"],
+    "collects_location": [r"locat", r"gps", r"latitude", r"longitude", r"coordinates", r"address", r"where you", r"city", r"region", r"country", r"zip", r"postal", r"geo", r"wi-?fi", r"cell tower", r"bluetooth", r"nearby"],
+    "collects_precise_location": [r"locat", r"gps", r"latitude", r"longitude", r"coordinates", r"precise", r"exact", r"geo", r"wi-?fi", r"cell tower", r"bluetooth", r"beacon"],
+    "collects_health_information": [r"health", r"medical", r"fitness", r"wellness", r"genetic", r"disabilit", r"diagnos", r"patient", r"symptom", r"prescription", r"pregnan", r"mental", r"heart", r"sleep", r"biometric", r"condition"],
+    "collects_children_data": [r"child", r"minor", r"kid(?<!\wkid)", r"teen", r"young", r"student", r"school", r"coppa", r"ferpa", r"parent", r"guardian", r"under (?:the age of )?1\d", r"ages?\b(?<!\wage)(?<!\wages)", r"years of age", r"years old"],
+    "sells_sensitive_data": [r"sell", r"sold", r"rent", r"monetary", r"monetiz", r"consideration", r"exchange", r"trade", r"licens"],
+    "shares_with_government": [r"government", r"law enforcement", r"authorit", r"subpoena", r"court", r"legal", r"lawful", r"regulat", r"police", r"agenc", r"official", r"warrant", r"national security"],
+    "forced_disclosure_of_data": [r"disclos", r"compel", r"subpoena", r"court", r"law enforcement", r"government", r"legal", r"lawful", r"warrant", r"required by law", r"comply", r"obligat", r"order"],
+    "binding_arbitration": [r"arbit", r"dispute", r"jams\b(?<!\wjams)", r"aaa\b(?<!\waaa)"],
+    "class_action_waiver": [r"class", r"collective", r"representative", r"consolidat", r"individual basis", r"jury", r"waive"],
+    "unilateral_terms_change": [r"chang", r"modif", r"amend", r"updat", r"revis", r"alter", r"replace", r"version", r"time to time"],
+    "indefinite_data_retention": [r"retain", r"retention", r"keep", r"kept", r"store", r"long", r"indefinite", r"permanen", r"forever", r"perpetu", r"maintain", r"hold", r"held", r"preserv", r"archiv", r"delet", r"eras", r"remov", r"destroy", r"period"],
+    "reidentifies_anonymous_data": [r"identif", r"anonym", r"pseudonym", r"aggregat", r"link", r"combin", r"match", r"hash"],
+}
+
+# Bit positions follow the flag order in FLAGS, so a bitmap lines up with the flag index.
+# Guardrail-only flags (not in FLAGS) are appended after them.
+FLAG_INDEX = dict(FLAGS_INDEX)
+
+
+class GuardrailScan:
+    """Result of one pass over a document: per-flag hit bitmaps (guardrails, topics) plus match offsets."""
+    __slots__ = ("bitmap", "topics", "offsets")
+
+    def __init__(self, bitmap: int, offsets: dict, topics: int = 0):
+        self.bitmap = bitmap
+        self.topics = topics
+        self.offsets = offsets  # flag_id -> [(start, end), ...]; first match only for topic-only keywords
+
+    def hits(self, flag_id) -> bool:
+        bit = FLAG_INDEX.get(flag_id)
+        return bit is not None and bool(self.bitmap >> bit & 1)
+
+    def mentions(self, flag_id) -> bool:
+        """A TOPIC_VOCABULARY keyword of the flag appears."""
+        bit = FLAG_INDEX.get(flag_id)
+        return bit is not None and bool(self.topics >> bit & 1)
+
+    def matches(self, flag_id) -> list:
+        return self.offsets.get(flag_id, [])
+
+    def to_dict(self) -> dict:
+        return {
+            "bitmap": self.bitmap,
+            "hits": sorted(self.offsets, key=FLAG_INDEX.get),
+            "offsets": {flag_id: [list(span) for span in spans] for flag_id, spans in self.offsets.items()},
+        }
+
+
+class GuardrailEngine:
+    """
+    Compiles GUARDRAILS and TOPIC_VOCABULARY once and checks every flag from a
+    single scan of a document.
+
+    Each distinct keyword is compiled once and searched once over one lowercased
+    copy of the text, no matter how many flags share it. (One big alternation was
+    tried first, but CPython's backtracking `re` is ~35x slower on it than on the
+    individual literals, which it can search with its fast substring path.)
+    """
+
+    def __init__(self, guardrails: dict, topics: dict = None):
+        self.guardrails = guardrails
+        self.topics = topics or {}
+        for flag_id in (*guardrails, *self.topics):
+            FLAG_INDEX.setdefault(flag_id, len(FLAG_INDEX))
+
+        pattern_flags = {}  # pattern -> (guardrail flags, topic flags)
+        for which, table in enumerate((guardrails, self.topics)):
+            for flag_id, patterns in table.items():
+                for pattern in patterns:
+                    pattern_flags.setdefault(pattern, ([], []))[which].append(flag_id)
+
+        # (compiled for lowered text, case-insensitive fallback, flags, guardrail bitmask, topic bitmask)
+        self.matchers = [
+            (
+                re.compile(pattern),
+                re.compile(pattern, re.IGNORECASE),
+                list(dict.fromkeys(guard + topic)),
+                sum(1 << FLAG_INDEX[f] for f in guard),
+                sum(1 << FLAG_INDEX[f] for f in topic),
+            )
+            for pattern, (guard, topic) in pattern_flags.items()
+        ]
+        # flag -> its guardrail patterns (same compiled objects), for one-flag checks without a scan
+        compiled = dict(zip(pattern_flags, self.matchers))
+        self.flag_matchers = {
+            flag_id: [compiled[pattern][:2] for pattern in dict.fromkeys(patterns)]
+            for flag_id, patterns in guardrails.items()
+        }
+
+    def scan(self, text: str) -> GuardrailScan:
+        bitmap, topics, offsets = 0, 0, {}
+        lowered = text.lower()
+        # lower() can change the length of a few non-ASCII strings; offsets must
+        # point into the original text, so fall back to case-insensitive search.
+        same_length = len(lowered) == len(text)
+        for plain, nocase, flag_ids, bits, topic_bits in self.matchers:
+            if bits:
+                spans = [m.span() for m in (plain.finditer(lowered) if same_length else nocase.finditer(text))]
+            else:  # pruning only needs to know the topic comes up: stop at the first match
+                first = plain.search(lowered) if same_length else nocase.search(text)
+                spans = [first.span()] if first else []
+            if not spans:
+                continue
+            bitmap |= bits
+            topics |= topic_bits
+            for flag_id in flag_ids:
+                offsets.setdefault(flag_id, []).extend(spans)
+        for spans in offsets.values():
+            spans.sort()
+        return GuardrailScan(bitmap, offsets, topics)
+
+    def passes(self, flag_id, scan: GuardrailScan) -> bool:
+        if flag_id not in self.guardrails: return True
+        return scan.hits(flag_id)
+
+    def passes_text(self, flag_id, text: str) -> bool:
+        """passes() for one flag without a full scan: only its patterns, stopping at the first hit."""
+        matchers = self.flag_matchers.get(flag_id)
+        if matchers is None: return True
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            return any(nocase.search(text) for _, nocase in matchers)
+        return any(plain.search(lowered) for plain, _ in matchers)
+
+    def may_be_present(self, flag_id, scan: GuardrailScan) -> bool:
+        """Worth asking the LLM about: passes its guardrail and its topic comes up."""
+        if not self.passes(flag_id, scan): return False
+        return flag_id not in self.topics or scan.mentions(flag_id)
+
+
+GUARDRAIL_ENGINE = GuardrailEngine(GUARDRAILS, TOPIC_VOCABULARY)
+
+def scan_guardrails(text: str) -> GuardrailScan:
+    return GUARDRAIL_ENGINE.scan(text)
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import threading
+
+from fastapi import HTTPException
+
+from cache import CACHE_PATH, open_sqlite
+from scheduler import current_priority, BACKGROUND
+
+# --- BACKGROUND JOBS ---
+# POST /api/jobs queues an analyze/compare payload in the shared SQLite file and
+# returns at once; each uvicorn worker runs a small pool of job runners that
+# claim queued jobs atomically, so several processes can share one queue.
+# A running job holds a lease that its runner keeps renewing. If the process
+# dies (or restarts) mid-job, the lease runs out and another runner picks the
+# job up again; a graceful shutdown hands its jobs back to the queue at once.
+
+JOB_CONCURRENCY = int(os.getenv("EVIDENTIA_JOB_CONCURRENCY", "2"))  # in-flight jobs per worker
+JOB_LEASE_SECONDS = float(os.getenv("EVIDENTIA_JOB_LEASE", "120"))
+JOB_POLL_SECONDS = float(os.getenv("EVIDENTIA_JOB_POLL", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("EVIDENTIA_JOB_MAX_ATTEMPTS", "3"))
+JOB_TTL_SECONDS = int(os.getenv("EVIDENTIA_JOB_TTL", str(24 * 3600)))  # finished jobs kept this long
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobStore:
+    """Job rows in the shared SQLite file. Claiming is one UPDATE, so it is atomic across processes."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path or ":memory:")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "created REAL NOT NULL, started REAL, finished REAL, lease_until REAL, worker TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def submit(self, kind: str, payload: dict) -> dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, now),
+            )
+        return {"id": job_id, "type": kind, "status": QUEUED, "created": now}
+
+    def claim(self, worker: str, lease: float = JOB_LEASE_SECONDS):
+        """Oldest runnable job, now leased to `worker`: (id, kind, payload, attempts) or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "started = COALESCE(started, ?) "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY created LIMIT 1) "
+                "RETURNING id, kind, payload, attempts",
+                (RUNNING, worker, now + lease, now, QUEUED, RUNNING, now),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, payload, attempts = row
+        return job_id, kind, json.loads(payload), attempts
+
+    def renew(self, job_id: str, worker: str, lease: float = JOB_LEASE_SECONDS) -> bool:
+        """Extend the lease; False if the job is no longer ours."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + lease, job_id, worker, RUNNING),
+            )
+        return cur.rowcount == 1
+
+    def finish(self, job_id: str, worker: str, result: dict = None, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, result = ?, error = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (FAILED if error is not None else DONE, time.time(),
+                 None if result is None else json.dumps(result), error, job_id, worker, RUNNING),
+            )
+
+    def release(self, worker: str) -> int:
+        """Put `worker`'s running jobs back in the queue (graceful shutdown)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL, attempts = attempts - 1 "
+                "WHERE worker = ? AND status = ?",
+                (QUEUED, worker, RUNNING),
+            )
+        return cur.rowcount
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, created, started, finished, attempts, result, error "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row[2] == QUEUED:
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?", (QUEUED, row[3])
+                ).fetchone()[0]
+        job_id, kind, status, created, started, finished, attempts, result, error = row
+        job = {"id": job_id, "type": kind, "status": status, "created": created,
+               "started": started, "finished": finished, "attempts": attempts}
+        if position is not None:
+            job["queue_position"] = position
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    def purge_finished(self, ttl: float = JOB_TTL_SECONDS) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (DONE, FAILED, time.time() - ttl)
+            )
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+
+class JobRunner:
+    """
+    Per-process pool of `concurrency` runner tasks. Handlers are registered by
+    job type and receive the stored payload; whatever they return is the result.
+    """
+
+    def __init__(self, store: JobStore, concurrency: int = JOB_CONCURRENCY,
+                 poll_interval: float = JOB_POLL_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.handlers = {}
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self._tasks = []
+        self._wakeup = None
+        self._last_purge = 0.0
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    # Store calls are SQLite writes that can wait out busy_timeout on a locked
+    # database, so they run in worker threads, never on the event loop.
+    async def submit(self, kind: str, payload: dict) -> dict:
+        if kind not in self.handlers:
+            raise HTTPException(status_code=400, detail=f"Error: Unknown job type '{kind}'.")
+        job = await asyncio.to_thread(self.store.submit, kind, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()  # don't wait out the poll interval in this process
+        return job
+
+    def start(self):
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._loop()) for _ in range(self.concurrency)]
+        print(f"🧵 Job runner {self.worker_id}: {self.concurrency} slots", flush=True)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await asyncio.to_thread(self.store.release, self.worker_id)
+        if released:
+            print(f"↩️ Returned {released} running job(s) to the queue", flush=True)
+
+    async def _loop(self):
+        current_priority.set(BACKGROUND)  # queued work never delays interactive requests
+        while True:
+            claimed = await asyncio.to_thread(self.store.claim, self.worker_id)
+            if claimed is None:
+                await self._maybe_purge()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(*claimed)
+
+    async def _run(self, job_id: str, kind: str, payload: dict, attempts: int):
+        handler = self.handlers.get(kind)
+        if handler is None:
+            await asyncio.to_thread(self.store.finish, job_id, self.worker_id, error=f"Unknown job type '{kind}'")
+            return
+        if attempts > self.max_attempts:
+            # Claimed again after repeated lease expiries: the job keeps killing its runner.
+            await asyncio.to_thread(self.store.finish, job_id, self.worker_id, error=f"Abandoned after {attempts - 1} attempts")
+            return
+
+        print(f"🧵 Job {job_id} ({kind}) started, attempt {attempts}", flush=True)
+        self.active += 1
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            try:
+                result = await handler(payload)
+            except HTTPException as he:
+                self.failed += 1
+                outcome = {"error": str(he.detail)}
+            except Exception as e:
+                self.failed += 1
+                outcome = {"error": str(e)}
+            else:
+                self.completed += 1
+                outcome = {"result": result}
+            await asyncio.to_thread(self.store.finish, job_id, self.worker_id, **outcome)
+        finally:
+            heartbeat.cancel()
+            self.active -= 1
+        print(f"🧵 Job {job_id} finished", flush=True)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await asyncio.to_thread(self.store.renew, job_id, self.worker_id)
+
+    async def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge > 600:
+            self._last_purge = now
+            await asyncio.to_thread(self.store.purge_finished)
+
+    def stats(self) -> dict:
+        return {
+            "worker": self.worker_id,
+            "slots": self.concurrency,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "jobs": self.store.stats(),
+        }
+
+
+JOB_STORE = JobStore()
+JOB_RUNNER = JobRunner(JOB_STORE)
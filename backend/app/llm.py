@@ -1,31 +1,90 @@
 import os
 import json
-import re
+import time
+import asyncio
 import hashlib
+from contextlib import nullcontext
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-
-# Direct imports
-from flags import FLAGS
-from weights import FLAG_WEIGHTS
 
+# Before the app modules below: cache, scheduler and neardup read EVIDENTIA_*
+# settings at import time (main.py does the same for the server).
 load_dotenv()
 
+# Direct imports
+from flags import FLAGS, FLAG_CATEGORY
+from weights import FLAG_WEIGHTS, MAX_RISK_BASELINE
+from score import score_findings
+from cache import ResultCache
+from singleflight import SingleFlight
+from chunking import split_into_chunks
+from scheduler import LLMScheduler, RateLimitedError
+from neardup import NearDuplicateIndex, NEAR_DUP_ENABLED, policy_digest, simhash
+from context import CHARS_PER_TOKEN, query_tokens, select_context
+from guardrails import GUARDRAILS, GUARDRAIL_ENGINE, TOPIC_VOCABULARY, GuardrailScan, scan_guardrails
+from metrics import ERRORS, NORMALIZE_BYTES_REMOVED, span, record_llm_usage
+from normalize import normalize_text
+from locator import EvidenceLocator, evidence_report, text_digest
+from prompts import DEFINITIONS, build_compare_prompt, build_extract_prompt, compare_config, extract_config
+from rules import classify, rules_report, rules_signature
+
 API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
+# EVIDENTIA_STUB_LLM=1 swaps Gemini for a local keyword-based stub (see stub_llm.py).
+STUB_LLM = os.getenv("EVIDENTIA_STUB_LLM") == "1"
+if not API_KEY and not STUB_LLM:
     print("Warning: Missing GEMINI_API_KEY")
 
-if API_KEY:
-    client = genai.Client(api_key=API_KEY)
-else:
-    client = None
+# google.genai takes most of a cold start to import, so the SDK and the client
+# are only loaded by the first request that needs them. Benchmarks assign a fake here.
+client = None
+
+def get_client():
+    """The Gemini (or stub) client, created on first use. None without an API key."""
+    global client
+    if client is None:
+        if STUB_LLM:
+            from stub_llm import StubClient
+            client = StubClient(latency=float(os.getenv("EVIDENTIA_STUB_LLM_LATENCY", "0.5")))
+        elif API_KEY:
+            from google import genai
+            client = genai.Client(api_key=API_KEY)
+    return client
+
+async def get_client_async():
+    """get_client() whose first, import-heavy call runs in a worker thread instead of on the event loop."""
+    return client if client is not None else await asyncio.to_thread(get_client)
+
+# --- PROMPT SIZE LIMITS ---
+# Documents longer than PROMPT_CHAR_LIMIT are analyzed in chunks ("chunked"),
+# reduced to their most relevant paragraphs ("ranked", see context.py),
+# or cut at the limit ("truncate", the old behaviour).
+PROMPT_CHAR_LIMIT = int(os.getenv("EVIDENTIA_PROMPT_CHAR_LIMIT", "70000"))
+SIDE_BY_SIDE_CHAR_LIMIT = int(os.getenv("EVIDENTIA_SIDE_BY_SIDE_CHAR_LIMIT", "40000"))
+LONG_DOC_MODE = os.getenv("EVIDENTIA_LONG_DOC_MODE", "chunked")
+# Token budget for "ranked" packing. Lower it to send fewer input tokens on every call.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("EVIDENTIA_CONTEXT_TOKEN_BUDGET", str(PROMPT_CHAR_LIMIT // CHARS_PER_TOKEN)))
+SIDE_BY_SIDE_TOKEN_BUDGET = int(os.getenv("EVIDENTIA_SIDE_BY_SIDE_TOKEN_BUDGET", str(SIDE_BY_SIDE_CHAR_LIMIT // CHARS_PER_TOKEN)))
+# Token budget for re-judging a few document-level flags of a new version (see analyze_flags).
+DOCUMENT_TOKEN_BUDGET = int(os.getenv("EVIDENTIA_DOCUMENT_TOKEN_BUDGET", "4000"))
+CHUNK_CHARS = int(os.getenv("EVIDENTIA_CHUNK_CHARS", "30000"))
+CHUNK_CONCURRENCY = int(os.getenv("EVIDENTIA_CHUNK_CONCURRENCY", "4"))
+MAX_QUOTE_CHARS = 600
+# When Gemini is unavailable or over quota, answer with a rules-only provisional
+# report (meta.provisional) instead of an error. Provisional reports are never cached.
+OFFLINE_FALLBACK = os.getenv("EVIDENTIA_OFFLINE_FALLBACK", "1") != "0"
+
+# --- LAYER 1: RESULT CACHE ---
+# Stores results so identical requests are instant and 100% consistent.
+# Bounded memory LRU in front of a SQLite store shared by all workers (see cache.py).
+RESULT_CACHE = ResultCache()
 
-MAX_RISK_BASELINE = 75 
+# Identical analyses that arrive while one is already running share its result.
+LLM_FLIGHTS = SingleFlight("llm")
 
-# --- LAYER 1: MEMORY CACHE ---
-# Stores results so identical requests are instant and 100% consistent.
-RESULT_CACHE = {}
+# Every Gemini call is queued, rate limited and retried here (see scheduler.py).
+LLM_SCHEDULER = LLMScheduler()
+
+# Near-identical texts (new date, whitespace, a tracking blurb) reuse an earlier result.
+NEAR_DUP_INDEX = NearDuplicateIndex()
 
 def get_flat_flags():
     """Flatten the FLAGS dict into a single map of ID -> Label"""
@@ -38,70 +97,68 @@ def get_flat_flags():
 FLAT_FLAGS = get_flat_flags()
 ALL_FLAG_KEYS = list(FLAT_FLAGS.keys())
 
-# --- DEFINITIONS & NEGATIVE CONSTRAINTS ---
-DEFINITIONS = {
-    "uses_cookies": "Mentions 'cookies', 'pixels', 'web beacons'. IGNORE: 'cookie-cutter' or food.",
-    "collects_location": "Mentions 'GPS', 'lat/long', 'physical address'. IGNORE: 'IP address' (that is separate).",
-    "collects_ip_address": "Explicitly mentions collecting 'IP address'.",
-    "collects_device_info": "Mentions 'device ID', 'MAC address', 'browser type'.",
-    "shares_for_advertising": "Mentions sharing with 'ad partners', 'marketing partners'. IGNORE: Internal marketing.",
-    "uses_targeted_ads": "Mentions 'interest-based ads', 'profiling'. IGNORE: Contextual ads.",
-    "uses_cross_site_tracking": "Mentions 'tracking across other websites', 'third-party cookies'.",
-    "sells_user_data": "Explicitly mentions 'selling' data. IF TEXT SAYS 'WE DO NOT SELL', THIS IS FALSE.",
-    "shares_with_data_brokers": "Mentions 'data brokers', 'aggregators'.",
-    "indefinite_data_retention": "Says data is kept 'indefinitely' or 'as long as necessary' with NO specific timeframe.",
-    "waives_rights": "Mentions 'class action waiver', 'jury trial waiver'. IGNORE: General 'legal rights'.",
-    "collects_children_data": "Mentions collecting data from children under 13/16. IF TEXT SAYS 'WE DO NOT knowingly collect', THIS IS FALSE.",
-}
+# DEFINITIONS, prompt templates and response schemas live in prompts.py.
+
+# --- CACHE KEYS ---
+# Keys carry the model and a fingerprint of the rubric, so editing DEFINITIONS,
+# FLAGS, GUARDRAILS or FLAG_WEIGHTS never serves results computed under the old rules.
+def _fingerprint(*parts) -> str:
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:12]
+
+# Bump when the shape of cached findings changes (2: evidence spans, unresolved quotes downgraded).
+RESULT_FORMAT = 2
+
+EXTRACTION_FINGERPRINT = _fingerprint(DEFINITIONS, FLAGS, GUARDRAILS, TOPIC_VOCABULARY, RESULT_FORMAT, rules_signature())
+SCORING_FINGERPRINT = _fingerprint(FLAG_WEIGHTS, MAX_RISK_BASELINE)
+
+def get_model_name() -> str:
+    return os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+def make_cache_key(kind: str, text_hash: str, model: str = None) -> str:
+    model = model or get_model_name()
+    return f"{kind}:{model}:{EXTRACTION_FINGERPRINT}:{SCORING_FINGERPRINT}:{text_hash}"
+
+def cache_scope(cache_key: str) -> str:
+    """Everything in a cache key except the text digest."""
+    return cache_key.rsplit(":", 1)[0]
 
 # --- LAYER 2: REGEX GUARDRAILS ---
-# If these keywords are NOT present, the flag is FORCED to False.
-GUARDRAILS = {
-    "sells_user_data": [r"sell", r"sold", r"rent", r"monetary", r"consideration", r"exchange"],
-    "collects_biometrics": [r"biometric", r"face", r"facial", r"fingerprint", r"voice", r"retina", r"iris"],
-    "shares_health_data": [r"health", r"medical", r"treatment", r"doctor", r"hospital", r"patient"],
-    "waives_rights": [r"class action", r"jury", r"arbitration", r"waive", r"dispute"],
-    "shares_with_data_brokers": [r"broker", r"aggregator", r"syndicate", r"cooperative"],
-    "uses_cross_site_tracking": [r"track", r"cross-site", r"third-party cookie", r"pixel", r"beacon", r"replay"],
-}
-
-def passes_guardrails(flag_id, text):
-    if flag_id not in GUARDRAILS: return True 
-    keywords = GUARDRAILS[flag_id]
-    text_lower = text.lower()
-    for word in keywords:
-        if re.search(word, text_lower): return True
-    return False
+# Keywords live in guardrails.py and are compiled once into a single matcher.
+# Pass a precomputed `scan` when checking many flags; without one only this
+# flag's own patterns are searched.
+def passes_guardrails(flag_id, text, scan: GuardrailScan = None):
+    if flag_id not in GUARDRAILS: return True
+    if scan is None: return GUARDRAIL_ENGINE.passes_text(flag_id, text)
+    return GUARDRAIL_ENGINE.passes(flag_id, scan)
 
 def get_category_for_flag(flag_id):
-    for cat, items in FLAGS.items():
-        if flag_id in items: return cat
-    return "general"
+    return FLAG_CATEGORY.get(flag_id, "general")
 
 def calculate_scores(findings: list) -> dict:
-    category_scores = {category: 0 for category in FLAGS.keys()}
-    overall_score = 0
-    for finding in findings:
-        flag = finding.get('flag')
-        status = finding.get('status')
-        confidence = finding.get('confidence', 1.0) 
-        category_key = finding.get('category')
-
-        if flag not in FLAG_WEIGHTS: continue
-        weight = FLAG_WEIGHTS.get(flag, 0)
-
-        if status == "true":
-            score_impact = weight * confidence
-            overall_score += score_impact
-            if category_key and category_key in category_scores:
-                category_scores[category_key] += score_impact
-
-    raw_score = (overall_score / MAX_RISK_BASELINE) * 100
-    final_score = min(raw_score, 100)
-    return {"overall_score": round(final_score, 2), "category_scores": category_scores}
-
-def convert_map_to_list(data_map, source_text):
+    # Vectorized over the flag index (see score.py); bulk re-scoring uses the same code.
+    return score_findings(findings)
+
+def diff_findings(findings_a: list, findings_b: list):
+    """Split risks into (common, only in A, only in B). Common entries are taken from A."""
+    risks_a = {f["flag"]: f for f in findings_a if f.get("status") == "true"}
+    risks_b = {f["flag"]: f for f in findings_b if f.get("status") == "true"}
+    common = [f for flag_id, f in risks_a.items() if flag_id in risks_b]
+    only_a = [f for flag_id, f in risks_a.items() if flag_id not in risks_b]
+    only_b = [f for flag_id, f in risks_b.items() if flag_id not in risks_a]
+    return common, only_a, only_b
+
+def has_valid_evidence(quote) -> bool:
+    return bool(quote) and len(quote) >= 10 and len(quote.split()) >= 3
+
+# Quotes that can't be found in the text are downgraded to "unknown": they no
+# longer count toward the score, and the UI shows the flag as unclear.
+UNRESOLVED_CONFIDENCE = 0.5
+
+def convert_map_to_list(data_map, source_text, scan: GuardrailScan = None, locator: EvidenceLocator = None):
     clean_findings = []
+    if scan is None: scan = scan_guardrails(source_text)
+    if locator is None: locator = EvidenceLocator(source_text)
     for flag_id, result in data_map.items():
         if flag_id not in FLAT_FLAGS: continue
 
@@ -109,203 +166,561 @@ def convert_map_to_list(data_map, source_text):
         quote = result.get("evidence", "")
 
         # Strict Evidence Check
-        if is_present:
-            if not quote or len(quote) < 10 or len(quote.split()) < 3:
-                is_present = False
+        if is_present and not has_valid_evidence(quote):
+            is_present = False
 
         # Guardrail Check
-        if is_present and not passes_guardrails(flag_id, source_text):
+        if is_present and not passes_guardrails(flag_id, source_text, scan):
             is_present = False
 
         if is_present:
-            clean_findings.append({
+            finding = {
                 "flag": flag_id,
                 "label": FLAT_FLAGS[flag_id],
                 "category": get_category_for_flag(flag_id),
                 "status": "true",
                 "confidence": 1.0,
-                "evidence_quote": quote
-            })
+                "evidence_quote": quote,
+            }
+            clean_findings.append(resolve_evidence(finding, locator))
     return clean_findings
 
+def resolve_evidence(finding: dict, locator: EvidenceLocator) -> dict:
+    """Attach the quote's span in the locator's text, downgrading the finding if there is none."""
+    span = locator.locate(finding.get("evidence_quote"))
+    finding["evidence_span"] = span
+    if span is None and finding.get("status") == "true":
+        finding["status"] = "unknown"
+        finding["confidence"] = UNRESOLVED_CONFIDENCE
+    return finding
+
+def with_analyzed_text(report: dict, clean_text: str) -> dict:
+    """
+    Copy of `report` carrying `analyzed_text`, the text its evidence spans point into.
+    A cached report may have been located in a slightly different cleaning of the same
+    policy (learned boilerplate changes), so its spans are re-resolved when the digests differ.
+    """
+    if "error" in report:
+        return report
+    meta = dict(report.get("meta") or {})
+    evidence = meta.get("evidence") or {}
+    findings = report.get("findings", [])
+    if evidence.get("text_hash") != text_digest(clean_text):
+        locator = EvidenceLocator(clean_text)
+        findings = [resolve_evidence(dict(f), locator) for f in findings]
+        meta["evidence"] = evidence_report(findings, clean_text)
+        return {**report, "findings": findings, **calculate_scores(findings), "meta": meta, "analyzed_text": clean_text}
+    return {**report, "analyzed_text": clean_text}
+
 # --- LAYER 3: NOISE CLEANER ---
 # Removes junk so the AI (and Guardrails) don't get confused by footers.
 def clean_noise(text: str) -> str:
-    lines = text.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        stripped = line.strip()
-        # Remove navigation/menu lines
-        if len(stripped) < 40 and ("Home" in stripped or "About" in stripped or "Contact" in stripped or "Login" in stripped):
-            continue
-        # Remove copyright/footer junk
-        if "rights reserved" in stripped.lower() or "copyright" in stripped.lower() or "©" in stripped:
-            continue
-        if not stripped:
-            continue
-        cleaned_lines.append(line)
-    return "\n".join(cleaned_lines)
+    return normalize(text).text
+
+
+def normalize(text: str):
+    """Run the normalization pipeline (see normalize.py) and count what each stage removed."""
+    normalized = normalize_text(text)
+    for stage in normalized.stages:
+        NORMALIZE_BYTES_REMOVED.inc(stage["removed"], stage=stage["stage"])
+    return normalized
 
 
 # --- SINGLE ANALYSIS ---
-def call_llm_extract(policy_text: str) -> dict:
-    if not client: return {"error": "API Key missing"}
-    
-    clean_text = clean_noise(policy_text)
-
-    # Cache Check
-    text_hash = hashlib.md5(clean_text.encode('utf-8')).hexdigest()
-    if text_hash in RESULT_CACHE:
+async def call_llm_extract(policy_text: str, mode: str = None, limit: asyncio.Semaphore = None, on_event=None,
+                           offline: bool = False, with_text: bool = False) -> dict:
+    """
+    Analyze one policy. `limit` optionally caps concurrent LLM work (batch jobs);
+    cache and near-duplicate hits never wait on it. `on_event(name, payload)` is an
+    optional async callback that receives progress events (see /api/analyze/stream).
+    `offline` answers from the caches or, failing that, the local rules only.
+    `with_text` adds `analyzed_text` (never cached), the text evidence spans point into.
+    """
+    unavailable = await get_client_async() is None
+    if unavailable and not (offline or OFFLINE_FALLBACK):
+        ERRORS.inc(type="unavailable")
+        return {"error": "API Key missing", "error_type": "unavailable"}
+    mode = resolve_extraction_mode(mode)
+
+    # Cleaning, hashing, SimHash and the SQLite lookups are CPU/disk work: they run
+    # in worker threads (asyncio.to_thread copies the request's context vars).
+    def clean_and_lookup():
+        with span("clean"):
+            normalized = normalize(policy_text)
+        with span("cache_lookup"):
+            text_hash = hashlib.md5(normalized.key_text.encode('utf-8')).hexdigest()
+            cache_key = make_cache_key(_mode_kind("single", mode), text_hash)
+            return normalized, text_hash, cache_key, RESULT_CACHE.get(cache_key)
+
+    normalized, text_hash, cache_key, cached = await asyncio.to_thread(clean_and_lookup)
+    clean_text = normalized.text
+
+    async def done(report):
+        return await asyncio.to_thread(with_analyzed_text, report, clean_text) if with_text else report
+
+    await _emit(on_event, "cleaned", {
+        "chars_in": len(policy_text), "chars_out": len(clean_text), "stages": normalized.stages,
+    })
+
+    if cached is not None:
         print("✅ Cache Hit (Single)")
-        return RESULT_CACHE[text_hash]
+        await _emit(on_event, "cache_hit", {"kind": "exact"})
+        return await done(cached)
+
+    fingerprint = digest = None
+    if NEAR_DUP_ENABLED:
+        fingerprint, digest, reused = await asyncio.to_thread(near_duplicate_lookup, clean_text, text_hash, cache_key)
+        if reused is not None:
+            print("♻️ Near-Duplicate Hit (Single)")
+            await _emit(on_event, "cache_hit", {"kind": "near_duplicate"})
+            return await done(reused)
+
+    if offline or unavailable:
+        if unavailable:
+            ERRORS.inc(type="unavailable")
+        return await done(await asyncio.to_thread(provisional_report, clean_text, "offline" if offline else "unavailable"))
+
+    async def analyze():
+        async with (limit or nullcontext()):
+            result = await _internal_analyze_strict(clean_text, cache_key, mode, on_event)
+        if fingerprint is not None and "error" not in result and not is_provisional(result):
+            await asyncio.to_thread(NEAR_DUP_INDEX.add, text_hash, fingerprint, cache_scope(cache_key), cache_key, digest)
+        return result
 
-    return _internal_analyze_strict(clean_text, text_hash)
+    return await done(await LLM_FLIGHTS.do(cache_key, analyze))
 
-def _internal_analyze_strict(policy_text, cache_key=None):
-    model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash") 
-    
-    properties = {}
-    for flag_id in ALL_FLAG_KEYS:
-        properties[flag_id] = {
-            "type": "object",
-            "properties": {"present": {"type": "boolean"}, "evidence": {"type": "string"}},
-            "required": ["present"]
-        }
-
-    config = types.GenerateContentConfig(
-        temperature=0.0,
-        top_k=1, # DETERMINISTIC
-        response_mime_type="application/json",
-        response_schema={
-            "type": "object", 
-            "properties": properties, 
-            "required": ALL_FLAG_KEYS 
-        }
-    )
-    
-    prompt = f"""
-    Analyze the LEGAL TEXT below. 
-    IGNORE any website navigation, footers, or marketing text. Focus ONLY on the privacy policy clauses.
-    
-    Definitions: {json.dumps(DEFINITIONS)}
-    
-    Text: 
-    {policy_text[:70000]}
+# --- NEAR-DUPLICATE REUSE ---
+def near_duplicate_lookup(clean_text: str, text_hash: str, cache_key: str):
+    """(fingerprint, digest, reused result or None) for a cache miss."""
+    with span("near_duplicate_lookup"):
+        fingerprint, digest = simhash(clean_text), policy_digest(clean_text)
+        return fingerprint, digest, reuse_near_duplicate(clean_text, text_hash, fingerprint, digest, cache_key)
+
+def reuse_near_duplicate(clean_text: str, text_hash: str, fingerprint: int, digest: str, cache_key: str):
     """
-    
+    Reuse the result of a previously analyzed text within the SimHash threshold
+    whose policy paragraphs are identical (see neardup.policy_digest), so the texts
+    differ only where no flag can be decided. Every evidence quote is located again
+    in the new text; findings whose quote no longer appears are dropped before re-scoring.
+    """
+    scope = cache_scope(cache_key)
+    match = NEAR_DUP_INDEX.find(fingerprint, scope, digest, exclude=text_hash)
+    if match is None:
+        return None
+    matched_hash, matched_key, distance = match
+    previous = RESULT_CACHE.get(matched_key)
+    if previous is None or "error" in previous:
+        return None
+
+    locator = EvidenceLocator(clean_text)
+    findings, dropped = [], []
+    for finding in previous.get("findings", []):
+        span = locator.locate(finding.get("evidence_quote"))
+        if span is not None:
+            findings.append({**finding, "evidence_span": span})  # offsets into the new text
+        else:
+            dropped.append(finding["flag"])
+
+    meta = dict(previous.get("meta") or {})
+    meta["near_duplicate"] = {"matched": matched_hash, "distance": distance, "dropped_flags": dropped}
+    meta["evidence"] = evidence_report(findings, clean_text)
+    result = {"findings": findings, **calculate_scores(findings), "meta": meta}
+    RESULT_CACHE.set(cache_key, result)
+    NEAR_DUP_INDEX.add(text_hash, fingerprint, scope, cache_key, digest)
+    return result
+
+def normalize_for_match(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def is_provisional(report: dict) -> bool:
+    return "provisional" in (report.get("meta") or {})
+
+def provisional_report(policy_text: str, reason: str, scan: GuardrailScan = None, decided: dict = None) -> dict:
+    """Rules-only report: flags the rules can't decide are listed in meta.provisional, not guessed."""
+    with span("rules"):
+        if scan is None: scan = scan_guardrails(policy_text)
+        candidates, pruned = select_candidate_flags(scan)
+        if decided is None: decided = classify(policy_text, candidates)
+        data = fill_pruned_flags({k: d.to_flag_result() for k, d in decided.items()}, pruned)
+        findings = convert_map_to_list(data, policy_text, scan)
+    return {
+        "findings": findings,
+        **calculate_scores(findings),
+        "meta": {
+            "provisional": {"reason": reason, "undecided_flags": [k for k in candidates if k not in decided]},
+            "rules": rules_report(decided),
+            "evidence": evidence_report(findings, policy_text),
+        },
+    }
+
+async def analyze_flags(clean_text: str, flag_keys: list, mode: str = None, digest: str = None) -> dict:
+    """
+    Judge only `flag_keys` over an already cleaned text: findings for those flags alone.
+    Gemini reads the paragraphs BM25 ranks highest for them (DOCUMENT_TOKEN_BUDGET), and
+    the result is cached under the text's policy digest, so versions whose policy
+    paragraphs are unchanged share one answer.
+    """
+    mode = resolve_extraction_mode(mode)
+    if digest is None:
+        digest = await asyncio.to_thread(policy_digest, clean_text)
+    flags_key = ",".join(sorted(flag_keys))
+    cache_key = make_cache_key(_mode_kind("document", mode), hashlib.md5(f"{digest}:{flags_key}".encode("utf-8")).hexdigest())
+    cached = await asyncio.to_thread(RESULT_CACHE.get, cache_key)
+    if cached is not None:
+        return cached
+
+    async def judge():
+        context, _ = await asyncio.to_thread(pack_context, clean_text, flag_keys, DOCUMENT_TOKEN_BUDGET)
+        return await _internal_analyze_strict(context, cache_key, mode, flag_keys=flag_keys)
+
+    return await LLM_FLIGHTS.do(cache_key, judge)
+
+async def _internal_analyze_strict(policy_text, cache_key=None, mode=None, on_event=None, flag_keys=None):
+    mode = resolve_extraction_mode(mode)
+    scan = decided = None
     try:
-        resp = client.models.generate_content(model=model, contents=prompt, config=config)
-        data = json.loads(resp.text)
-        findings = convert_map_to_list(data, policy_text)
-        result = {"findings": findings, **calculate_scores(findings)}
-        if cache_key: RESULT_CACHE[cache_key] = result
-        return result
+        # Pre-pass: flags whose guardrail keywords never appear can't be true,
+        # so they are left out of the schema instead of paying for their output tokens.
+        def prescan():
+            with span("guardrails"):
+                scan = scan_guardrails(policy_text)
+                candidates, pruned = select_candidate_flags(scan)
+                if flag_keys is not None:
+                    candidates = [k for k in candidates if k in flag_keys]
+                    pruned = [k for k in pruned if k in flag_keys]
+            return scan, candidates, pruned
+
+        # The scan, the rules, context packing, evidence location and the cache
+        # write are CPU/disk work, so each runs in a worker thread.
+        scan, candidates, pruned = await asyncio.to_thread(prescan)
+        meta = {"pruning": pruning_report(candidates, pruned)}
+        await _emit(on_event, "guardrails", {"hits": scan.to_dict()["hits"], "pruning": meta["pruning"]})
+        locator = EvidenceLocator(policy_text)
+
+        # Flags the local rules decide with certainty never reach Gemini (see rules.py).
+        def run_rules():
+            with span("rules"):
+                return classify(policy_text, candidates)
+
+        decided = await asyncio.to_thread(run_rules)
+        candidates = [k for k in candidates if k not in decided]
+        meta["rules"] = rules_report(decided, sent_to_llm=len(candidates))
+
+        # Partial findings as each shard/chunk finishes, for streaming clients.
+        async def on_partial(data, source):
+            partial_findings = await asyncio.to_thread(convert_map_to_list, data, policy_text, scan, locator)
+            await _emit(on_event, "partial", {"source": source, "findings": partial_findings})
+        on_partial = on_partial if on_event else None
+
+        if not candidates:
+            data = {}
+        elif len(policy_text) > PROMPT_CHAR_LIMIT and LONG_DOC_MODE == "chunked":
+            data, chunk_meta = await _analyze_chunked(policy_text, candidates, mode, on_partial)
+            meta.update(chunk_meta)
+        else:
+            def build_prompt():
+                with span("prompt_build"):
+                    if LONG_DOC_MODE == "ranked":
+                        prompt_text, meta["context"] = pack_context(policy_text, candidates, CONTEXT_TOKEN_BUDGET)
+                        return prompt_text
+                    return policy_text[:PROMPT_CHAR_LIMIT]
+
+            prompt_text = await asyncio.to_thread(build_prompt)
+            data, extraction_meta = await _extract(prompt_text, candidates, mode, on_partial)
+            meta["extraction"] = extraction_meta
+
+        def score(data):
+            with span("scoring"):
+                data = fill_pruned_flags(data, pruned)
+                data.update({k: d.to_flag_result() for k, d in decided.items()})
+                findings = convert_map_to_list(data, policy_text, scan, locator)
+                meta["evidence"] = evidence_report(findings, policy_text)
+                result = {"findings": findings, **calculate_scores(findings), "meta": meta}
+            if cache_key: RESULT_CACHE.set(cache_key, result)
+            return result
+
+        return await asyncio.to_thread(score, data)
     except Exception as e:
-        return {"findings": [], "overall_score": 0, "category_scores": {}, "error": str(e)}
-
+        ERRORS.inc(type=error_type(e))
+        if OFFLINE_FALLBACK:
+            print(f"⚠️ LLM failed ({error_type(e)}): returning a provisional rules-only report", flush=True)
+            return await asyncio.to_thread(provisional_report, policy_text, error_type(e), scan, decided)
+        return {"findings": [], "overall_score": 0, "category_scores": {}, "error": str(e), "error_type": error_type(e)}
+
+# --- EXTRACTION MODES ---
+# "monolithic": one structured-output call covering every candidate flag.
+# "sharded":    one smaller call per FLAGS category, all issued concurrently.
+#               Shorter JSON per call means less sequential token generation.
+EXTRACTION_MODES = ("monolithic", "sharded")
+EXTRACTION_MODE = os.getenv("EVIDENTIA_EXTRACTION_MODE", "monolithic")
+
+def resolve_extraction_mode(mode: str = None) -> str:
+    mode = mode or EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode '{mode}'. Use one of: {', '.join(EXTRACTION_MODES)}")
+    return mode
+
+def _mode_kind(kind: str, mode: str) -> str:
+    return kind if mode == "monolithic" else f"{kind}-{mode}"
+
+async def _extract(policy_text: str, flag_keys: list, mode: str, on_partial=None):
+    """Run one extraction in the given mode. Returns (raw flag map, timing meta)."""
+    started = time.perf_counter()
+    if mode == "sharded":
+        data, shards = await _extract_sharded(policy_text, flag_keys, on_partial)
+    else:
+        data, shards = await _extract_flag_map(policy_text, flag_keys), None
+        if on_partial: await on_partial(data, "all")
+    extraction_meta = {"mode": mode, "wall_ms": _elapsed_ms(started)}
+    if shards is not None: extraction_meta["shards"] = shards
+    return data, extraction_meta
+
+async def _extract_sharded(policy_text: str, flag_keys: list, on_partial=None):
+    shards = []
+    for category, items in FLAGS.items():
+        keys = [k for k in flag_keys if k in items]
+        if keys: shards.append((category, keys))
+
+    async def run(category, keys):
+        started = time.perf_counter()
+        data = await _extract_flag_map(policy_text, keys)
+        if on_partial: await on_partial(data, category)
+        return data, {"category": category, "flags": len(keys), "latency_ms": _elapsed_ms(started)}
+
+    results = await asyncio.gather(*(run(category, keys) for category, keys in shards))
+    merged = {}
+    for data, _ in results:
+        merged.update(data)
+    return merged, [timing for _, timing in results]
+
+def estimate_tokens(prompt: str, flag_count: int) -> int:
+    """Rough input + output size of one call, for the tokens/minute budget."""
+    return len(prompt) // CHARS_PER_TOKEN + 60 * flag_count
+
+def error_type(error: Exception) -> str:
+    return "rate_limited" if isinstance(error, RateLimitedError) else "llm_error"
+
+async def _emit(on_event, name: str, payload: dict):
+    if on_event is not None:
+        await on_event(name, payload)
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+# --- SCHEMA PRUNING ---
+def select_candidate_flags(scan: GuardrailScan):
+    """Split flags into (candidates for the LLM, pruned) using the guardrail scan."""
+    candidates, pruned = [], []
+    for flag_id in ALL_FLAG_KEYS:
+        (candidates if GUARDRAIL_ENGINE.may_be_present(flag_id, scan) else pruned).append(flag_id)
+    return candidates, pruned
+
+def fill_pruned_flags(data: dict, pruned: list) -> dict:
+    """Pruned flags get a deterministic 'not present' result."""
+    filled = dict(data)
+    for flag_id in pruned:
+        filled[flag_id] = {"present": False, "evidence": ""}
+    return filled
+
+def pruning_report(candidates: list, pruned: list) -> dict:
+    total = len(candidates) + len(pruned)
+    return {
+        "candidates": len(candidates),
+        "pruned": len(pruned),
+        "ratio": round(len(pruned) / total, 3) if total else 0.0,
+        "pruned_flags": pruned,
+    }
 
-# --- SINGLE PASS COMPARISON ---
-def call_llm_compare_side_by_side(text_a: str, text_b: str) -> dict:
-    if not client: return {"error": "API Key missing"}
+# --- CONTEXT SELECTION ---
+def flag_queries(flag_keys: list) -> dict:
+    """BM25 query per flag: its label, DEFINITIONS entry, GUARDRAILS and TOPIC_VOCABULARY keywords."""
+    return {
+        flag_id: query_tokens(
+            FLAT_FLAGS.get(flag_id, ""),
+            flag_id.replace("_", " "),
+            DEFINITIONS.get(flag_id, ""),
+            *GUARDRAILS.get(flag_id, []),
+            *TOPIC_VOCABULARY.get(flag_id, []),
+        )
+        for flag_id in flag_keys
+    }
 
-    clean_a = clean_noise(text_a)
-    clean_b = clean_noise(text_b)
+def pack_context(policy_text: str, flag_keys: list, token_budget: int):
+    """Returns (text to send, report of how much of the document was kept)."""
+    return select_context(policy_text, flag_queries(flag_keys), token_budget)
 
-    # 1. Cache Check (Combined Hash)
-    combined_hash = hashlib.md5((clean_a + clean_b).encode('utf-8')).hexdigest()
-    if combined_hash in RESULT_CACHE:
-        print("✅ Cache Hit (Comparison)")
-        return RESULT_CACHE[combined_hash]
+async def _extract_flag_map(policy_text: str, flag_keys: list = None) -> dict:
+    """One structured-output call. Returns the raw {flag_id: {present, evidence}} map."""
+    model = get_model_name()
+    flag_keys = flag_keys or ALL_FLAG_KEYS
 
-    # 2. Setup AI
-    model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash") 
+    def build_prompt():
+        with span("prompt_build"):  # the first extract_config() imports google.genai
+            return extract_config(tuple(flag_keys)), build_extract_prompt(policy_text, flag_keys)
 
-    single_policy_schema = {}
+    config, prompt = await asyncio.to_thread(build_prompt)
+    with span("llm_call"):
+        resp = await LLM_SCHEDULER.run(
+            lambda: get_client().aio.models.generate_content(model=model, contents=prompt, config=config),
+            tokens=estimate_tokens(prompt, len(flag_keys)),
+        )
+    record_llm_usage(resp, "extract")
+    return json.loads(resp.text)
+
+
+# --- LONG DOCUMENTS: MAP-REDUCE OVER CHUNKS ---
+# Text past the prompt limit used to be silently dropped, and that is often where
+# arbitration and retention clauses live. Instead, analyze every chunk (in parallel,
+# under a cap) and merge the per-flag results.
+async def _analyze_chunked(policy_text: str, flag_keys: list, mode: str = "monolithic", on_partial=None):
+    chunks = await asyncio.to_thread(split_into_chunks, policy_text, CHUNK_CHARS)
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def run(index, chunk):
+        async with semaphore:
+            data = await _analyze_chunk(chunk, flag_keys, mode)
+        if on_partial: await on_partial(data, f"chunk {index + 1}/{len(chunks)}")
+        return data
+
+    print(f"🧩 Chunked analysis: {len(chunks)} chunks", flush=True)
+    started = time.perf_counter()
+    chunk_maps = await asyncio.gather(*(run(i, chunk) for i, chunk in enumerate(chunks)))
+    extraction_meta = {"mode": mode, "wall_ms": _elapsed_ms(started)}
+    return merge_flag_maps(chunk_maps), {"chunks": len(chunks), "extraction": extraction_meta}
+
+async def _analyze_chunk(chunk: str, flag_keys: list, mode: str = "monolithic") -> dict:
+    # Candidates come from the whole document, so they are part of the chunk key.
+    chunk_hash = hashlib.md5((",".join(flag_keys) + "\n" + chunk).encode('utf-8')).hexdigest()
+    cache_key = make_cache_key(_mode_kind("chunk", mode), chunk_hash)
+    cached = await asyncio.to_thread(RESULT_CACHE.get, cache_key)
+    if cached is not None:
+        return cached
+
+    async def work():
+        data, _ = await _extract(chunk, flag_keys, mode)
+        await asyncio.to_thread(RESULT_CACHE.set, cache_key, data)
+        return data
+
+    return await LLM_FLIGHTS.do(cache_key, work)
+
+def merge_flag_maps(flag_maps: list) -> dict:
+    """A flag is present if any chunk backs it with valid evidence; keep the best quote."""
+    merged = {}
     for flag_id in ALL_FLAG_KEYS:
-        single_policy_schema[flag_id] = {
-            "type": "object",
-            "properties": {
-                "present": {"type": "boolean"}, 
-                "evidence": {"type": "string"}
-            },
-            "required": ["present"]
-        }
-
-    comparison_schema = {
-        "type": "object",
-        "properties": {
-            "policy_A": {
-                "type": "object", 
-                "properties": single_policy_schema, 
-                "required": ALL_FLAG_KEYS
-            },
-            "policy_B": {
-                "type": "object", 
-                "properties": single_policy_schema, 
-                "required": ALL_FLAG_KEYS
-            }
-        },
-        "required": ["policy_A", "policy_B"]
-    }
+        quotes = []
+        for data in flag_maps:
+            result = data.get(flag_id) or {}
+            quote = result.get("evidence", "")
+            if result.get("present", False) and has_valid_evidence(quote):
+                quotes.append(quote)
+        if quotes:
+            merged[flag_id] = {"present": True, "evidence": _best_quote(quotes)}
+        else:
+            merged[flag_id] = {"present": False, "evidence": ""}
+    return merged
+
+def _best_quote(quotes: list) -> str:
+    # Prefer the most complete clause, but not a runaway multi-paragraph dump.
+    within_limit = [q for q in quotes if len(q) <= MAX_QUOTE_CHARS]
+    return max(within_limit or quotes, key=lambda q: len(q.split()))
 
-    config = types.GenerateContentConfig(
-        temperature=0.0,
-        top_k=1, # DETERMINISTIC
-        max_output_tokens=8192,
-        response_mime_type="application/json",
-        response_schema=comparison_schema
-    )
-
-    prompt = f"""
-    You are an impartial legal judge. Compare these two privacy policies side-by-side.
-    
-    INSTRUCTIONS:
-    1. IGNORE website noise (headers, footers, navigation menus).
-    2. Focus ONLY on the legal clauses.
-    3. Consistency is CRITICAL. If A and B contain similar text, their flags MUST match.
-    
-    DEFINITIONS:
-    {json.dumps(DEFINITIONS, indent=2)}
-
-    ----- POLICY A START -----
-    {clean_a[:40000]}
-    ----- POLICY A END -----
-
-    ----- POLICY B START -----
-    {clean_b[:40000]}
-    ----- POLICY B END -----
-    """
+
+# --- SINGLE PASS COMPARISON ---
+async def call_llm_compare_side_by_side(text_a: str, text_b: str) -> dict:
+    if await get_client_async() is None:
+        ERRORS.inc(type="unavailable")
+        return {"error": "API Key missing", "error_type": "unavailable"}
+
+    # CPU/disk stages run in worker threads, as in call_llm_extract.
+    def clean_and_lookup():
+        with span("clean"):
+            normalized_a = normalize(text_a)
+            normalized_b = normalize(text_b)
+
+        # 1. Cache Check (Combined Hash)
+        with span("cache_lookup"):
+            combined_hash = hashlib.md5((normalized_a.key_text + normalized_b.key_text).encode('utf-8')).hexdigest()
+            cache_key = make_cache_key("compare", combined_hash)
+            return normalized_a.text, normalized_b.text, cache_key, RESULT_CACHE.get(cache_key)
+
+    clean_a, clean_b, cache_key, cached = await asyncio.to_thread(clean_and_lookup)
+    if cached is not None:
+        print("✅ Cache Hit (Comparison)")
+        return cached
+
+    # Too long to fit both sides in one prompt: analyze each side on its own
+    # (chunked where needed) instead of truncating.
+    if LONG_DOC_MODE == "chunked" and max(len(clean_a), len(clean_b)) > SIDE_BY_SIDE_CHAR_LIMIT:
+        report_a, report_b = await asyncio.gather(call_llm_extract(text_a), call_llm_extract(text_b))
+        return {"reportA": report_a, "reportB": report_b}
+
+    # 2. Setup AI
+    model = get_model_name()
+
+    # Only ask for flags that could be true on at least one side.
+    def prescan():
+        with span("guardrails"):
+            scan_a = scan_guardrails(clean_a)
+            scan_b = scan_guardrails(clean_b)
+            return scan_a, scan_b, select_candidate_flags(scan_a), select_candidate_flags(scan_b)
+
+    scan_a, scan_b, (candidates_a, pruned_a), (candidates_b, pruned_b) = await asyncio.to_thread(prescan)
+    candidate_set = set(candidates_a) | set(candidates_b)
+    candidates = [k for k in ALL_FLAG_KEYS if k in candidate_set]
+
+    meta_a = {"pruning": pruning_report(candidates_a, pruned_a)}
+    meta_b = {"pruning": pruning_report(candidates_b, pruned_b)}
+
+    def build_prompt():
+        with span("prompt_build"):
+            if LONG_DOC_MODE == "ranked":
+                prompt_a, meta_a["context"] = pack_context(clean_a, candidates, SIDE_BY_SIDE_TOKEN_BUDGET)
+                prompt_b, meta_b["context"] = pack_context(clean_b, candidates, SIDE_BY_SIDE_TOKEN_BUDGET)
+            else:
+                prompt_a = clean_a[:SIDE_BY_SIDE_CHAR_LIMIT]
+                prompt_b = clean_b[:SIDE_BY_SIDE_CHAR_LIMIT]
+            return compare_config(tuple(candidates)), build_compare_prompt(prompt_a, prompt_b, candidates)
+
+    config, prompt = await asyncio.to_thread(build_prompt)
 
     try:
-        response = client.models.generate_content(
-            model=model, 
-            contents=prompt,
-            config=config
-        )
-        
-        data = json.loads(response.text)
+        data = {}
+        if candidates:
+            with span("llm_call"):
+                response = await LLM_SCHEDULER.run(
+                    lambda: get_client().aio.models.generate_content(model=model, contents=prompt, config=config),
+                    tokens=estimate_tokens(prompt, 2 * len(candidates)),
+                )
+            record_llm_usage(response, "compare")
+            data = json.loads(response.text)
         
-        raw_a = data.get("policy_A", {})
-        raw_b = data.get("policy_B", {})
+        def score():
+            with span("scoring"):
+                raw_a = fill_pruned_flags(data.get("policy_A", {}), pruned_a)
+                raw_b = fill_pruned_flags(data.get("policy_B", {}), pruned_b)
 
-        findings_a = convert_map_to_list(raw_a, clean_a)
-        findings_b = convert_map_to_list(raw_b, clean_b)
+                findings_a = convert_map_to_list(raw_a, clean_a, scan_a)
+                findings_b = convert_map_to_list(raw_b, clean_b, scan_b)
 
-        report_a = {"findings": findings_a, **calculate_scores(findings_a)}
-        report_b = {"findings": findings_b, **calculate_scores(findings_b)}
+                report_a = {"findings": findings_a, **calculate_scores(findings_a), "meta": meta_a}
+                report_b = {"findings": findings_b, **calculate_scores(findings_b), "meta": meta_b}
 
-        result = {
-            "reportA": report_a,
-            "reportB": report_b
-        }
+            result = {
+                "reportA": report_a,
+                "reportB": report_b
+            }
 
-        RESULT_CACHE[combined_hash] = result
-        return result
+            RESULT_CACHE.set(cache_key, result)
+            return result
+
+        return await asyncio.to_thread(score)
 
     except Exception as e:
         print(f"Comparison Error: {str(e)}")
+        ERRORS.inc(type=error_type(e))
         return {
             "reportA": {"findings": [], "overall_score": 0, "category_scores": {}},
             "reportB": {"findings": [], "overall_score": 0, "category_scores": {}},
-            "error": str(e)
+            "error": str(e),
+            "error_type": error_type(e)
         }
\ No newline at end of file
@@ -0,0 +1,91 @@
+import re
+import hashlib
+
+# --- EVIDENCE LOCATOR ---
+# Resolves an evidence quote to character offsets in the analyzed text.
+# The text is indexed once as a word stream (lowercased \w+ tokens with their
+# offsets) plus an inverted index word -> positions. A quote is matched as a
+# token sequence, so case, whitespace and punctuation differences don't matter;
+# candidates come from the postings of the quote's rarest word, so each lookup
+# costs a handful of list comparisons instead of a scan of the whole document.
+
+WORD_RE = re.compile(r"\w+")
+ELLIPSIS_RE = re.compile(r"\s*(?:\.{3,}|…|\[\s*\.\.\.\s*\])\s*")
+
+
+def quote_tokens(quote: str) -> list:
+    return [w.lower() for w in WORD_RE.findall(quote)]
+
+
+class EvidenceLocator:
+    def __init__(self, text: str):
+        self.text = text
+        self._words = None  # built on first lookup
+
+    def _build(self):
+        # Lookups may run in several worker threads: _words is published last,
+        # so a concurrent lookup either sees the whole index or builds its own.
+        starts, ends, words, postings = [], [], [], {}
+        for position, match in enumerate(WORD_RE.finditer(self.text)):
+            word = match.group().lower()
+            starts.append(match.start())
+            ends.append(match.end())
+            words.append(word)
+            postings.setdefault(word, []).append(position)
+        self._starts, self._ends, self._postings = starts, ends, postings
+        self._words = words
+
+    def _find(self, tokens: list, after: int = 0):
+        """First token position >= `after` where `tokens` occur in sequence, or None."""
+        if self._words is None:
+            self._build()
+        postings = [self._postings.get(t) for t in tokens]
+        if not all(postings):
+            return None
+        anchor = min(range(len(tokens)), key=lambda i: len(postings[i]))
+        length = len(tokens)
+        for position in postings[anchor]:
+            start = position - anchor
+            if start >= after and self._words[start:start + length] == tokens:
+                return start
+        return None
+
+    def locate(self, quote: str):
+        """{"start", "end", "match"} for `quote`, or None if it isn't in the text."""
+        quote = (quote or "").strip()
+        tokens = quote_tokens(quote)
+        if not tokens:
+            return None
+        start = self._find(tokens)
+        if start is not None:
+            begin = self._starts[start]
+            if self.text.startswith(quote, begin):
+                return {"start": begin, "end": begin + len(quote), "match": "exact"}
+            return {"start": begin, "end": self._ends[start + len(tokens) - 1], "match": "normalized"}
+
+        # "first part ... second part": every fragment must appear, in order.
+        fragments = [quote_tokens(f) for f in ELLIPSIS_RE.split(quote)]
+        fragments = [f for f in fragments if f]
+        if len(fragments) < 2:
+            return None
+        first = cursor = None
+        for tokens in fragments:
+            position = self._find(tokens, cursor or 0)
+            if position is None:
+                return None
+            if first is None:
+                first = position
+            cursor = position + len(tokens)
+        return {"start": self._starts[first], "end": self._ends[cursor - 1], "match": "fragments"}
+
+
+def text_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def evidence_report(findings: list, text: str) -> dict:
+    """Resolution counts, plus the digest of the text the spans point into (see llm.with_analyzed_text)."""
+    quoted = [f for f in findings if f.get("evidence_quote")]
+    resolved = sum(1 for f in quoted if f.get("evidence_span"))
+    return {"offsets": "analyzed_text", "text_hash": text_digest(text),
+            "resolved": resolved, "unresolved": len(quoted) - resolved}
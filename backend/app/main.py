@@ -1,14 +1,54 @@
 import os
-import requests
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import hmac
+import time
+import asyncio
+from contextlib import asynccontextmanager
+import json
+from urllib.parse import urlsplit
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import Optional, Dict, Any, List
 from fastapi.middleware.cors import CORSMiddleware
+from dotenv import load_dotenv
+
+# Before the app modules: they read EVIDENTIA_* settings at import time.
+load_dotenv()
 
 # Direct import from your llm.py
-from llm import call_llm_extract
+from llm import call_llm_extract, diff_findings, resolve_extraction_mode, RESULT_CACHE, LLM_FLIGHTS, LLM_SCHEDULER, NEAR_DUP_INDEX
+from scheduler import current_priority, BATCH
+from fetch import fetch_policy_text, close_http_client, FETCH_CACHE, FETCH_FLIGHTS
+from versions import analyze_versioned, VERSION_STORE
+from rescore import rescore_cache
+from comparison import build_comparison
+from jobs import JOB_RUNNER
+from normalize import BOILERPLATE_MODEL, current_source
+from responses import add_compression, conditional_json
+from metrics import (
+    REGISTRY, HTTP_REQUESTS, HTTP_SECONDS, LLM_QUEUE_DEPTH, LLM_CONCURRENCY,
+    span, start_request_timings, timing_breakdown, record_cache_stats,
+)
+
+# --- BATCH LIMITS ---
+# Per batch request: scrapes and LLM calls each get their own worker budget.
+BATCH_FETCH_CONCURRENCY = int(os.getenv("EVIDENTIA_BATCH_FETCH_CONCURRENCY", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("EVIDENTIA_BATCH_LLM_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("EVIDENTIA_BATCH_MAX_ITEMS", "500"))
+MULTI_COMPARE_MAX_ITEMS = int(os.getenv("EVIDENTIA_MULTI_COMPARE_MAX_ITEMS", "20"))
+
+# --- ADMIN ---
+# /api/admin/* requires this value in the X-Admin-Token header; without it the endpoints are disabled.
+ADMIN_TOKEN = os.getenv("EVIDENTIA_ADMIN_TOKEN")
 
-app = FastAPI(title="Evidentia API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    JOB_RUNNER.start()
+    yield
+    await JOB_RUNNER.stop()
+    await close_http_client()
+
+app = FastAPI(title="Evidentia API", lifespan=lifespan)
 
 # --- CORS SETTINGS ---
 app.add_middleware(
@@ -17,125 +57,289 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # lets the frontend revalidate cached results
 )
+add_compression(app)
 
-# --- YELLOWCAKE CONFIG ---
-YELLOWCAKE_API_KEY = os.getenv("YELLOWCAKE_API_KEY") 
-YELLOWCAKE_URL = "https://api.yellowcake.dev/v1/extract" 
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    HTTP_REQUESTS.inc(route=path, status=response.status_code)
+    HTTP_SECONDS.observe(time.perf_counter() - started, route=path)
+    return response
 
 class AnalyzeRequest(BaseModel):
     text: str
     url: Optional[str] = None
+    mode: Optional[str] = None  # "monolithic" | "sharded"; defaults to EVIDENTIA_EXTRACTION_MODE
+    document_id: Optional[str] = None  # enables version tracking under this id
+    track_versions: bool = False  # version-track a URL input, keyed by the URL
+    refresh: bool = False  # re-scrape URLs instead of using the fetch cache
+    timings: bool = False  # add a per-stage timing breakdown to meta
+    offline: bool = False  # no LLM call: cached result, else a provisional rules-only report
+    include_text: bool = False  # add analyzed_text, the text evidence_span offsets point into
 
 class CompareRequest(BaseModel):
     textA: str
     textB: str
     urlA: Optional[str] = None
     urlB: Optional[str] = None
+    mode: Optional[str] = None
+    refresh: bool = False
+    timings: bool = False
+    compact: bool = False  # comparison lists hold flag ids instead of copies of the findings
+    offline: bool = False
+
+class MultiCompareRequest(BaseModel):
+    items: List[str]  # pasted texts and/or URLs
+    labels: Optional[List[str]] = None  # display names, one per item
+    mode: Optional[str] = None
+    refresh: bool = False
+    compact: bool = False
+
+class BatchRequest(BaseModel):
+    items: List[str]  # pasted texts and/or URLs
+    mode: Optional[str] = None
+    refresh: bool = False
+
+class JobRequest(BaseModel):
+    type: str  # "analyze" | "compare"
+    payload: Dict[str, Any]  # the body /api/analyze or /api/compare would take
 
 @app.get("/api/health")
 def health():
     return {"ok": True}
 
-# --- HELPER: YELLOWCAKE FETCHER ---
-def fetch_from_yellowcake(target_url: str) -> str:
-    if not YELLOWCAKE_API_KEY:
-        print("⚠️ Warning: No Yellowcake API Key found.", flush=True)
-        raise HTTPException(status_code=400, detail="Error: Scraper API Key missing.")
-
-    print(f"🍰 Calling Yellowcake for: {target_url}", flush=True)
-    
-    headers = {
-        "x-api-key": YELLOWCAKE_API_KEY,
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "url": target_url,
-        "prompt": "privacy policy"
+@app.get("/api/stats")
+def stats() -> Dict[str, Any]:
+    return {
+        "cache": RESULT_CACHE.stats(),
+        "fetch_cache": FETCH_CACHE.stats(),
+        "near_duplicate": NEAR_DUP_INDEX.stats(),
+        "boilerplate": BOILERPLATE_MODEL.stats() if BOILERPLATE_MODEL else None,
+        "scheduler": LLM_SCHEDULER.stats(),
+        "jobs": JOB_RUNNER.stats(),
+        "singleflight": {
+            "llm": LLM_FLIGHTS.stats(),
+            "fetch": FETCH_FLIGHTS.stats(),
+        },
     }
 
-    try:
-        response = requests.post(YELLOWCAKE_URL, json=payload, headers=headers, timeout=30)
-        print(f"✅ Yellowcake Status: {response.status_code}", flush=True)
-        
-        if response.status_code == 200:
-            data = response.json()
-            text = data.get("text") or data.get("content") or data.get("data") or ""
-            
-            # PROTECT AGAINST BLOCKS: If the text is too short, it's a failed scrape
-            if len(str(text).strip()) < 200:
-                print(f"⚠️ Scraping failed: Text too short ({len(str(text))} chars)", flush=True)
-                raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
-            
-            print(f"📄 Extracted {len(text)} chars from URL.", flush=True)
-            return str(text)
-        else:
-            raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
-            
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        print(f"❌ Yellowcake Error: {str(e)}", flush=True)
-        raise HTTPException(status_code=400, detail="Error: SITE_PROTECTED")
+@app.get("/api/metrics")
+def metrics() -> PlainTextResponse:
+    """Prometheus text format. Cache and scheduler figures are sampled at scrape time."""
+    record_cache_stats("result", RESULT_CACHE.stats())
+    record_cache_stats("fetch", FETCH_CACHE.stats())
+    scheduler = LLM_SCHEDULER.stats()
+    for priority, depth in scheduler["queued"].items():
+        LLM_QUEUE_DEPTH.set(depth, priority=priority)
+    LLM_CONCURRENCY.set(scheduler["concurrency"])
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # --- HELPER: ROBUST URL DETECTOR ---
-def process_input(input_text: str) -> str:
-    clean_input = input_text.strip()
+def is_url(input_text: str) -> bool:
+    return input_text.strip().lower().startswith(("http://", "https://"))
+
+async def process_input(input_text: str, refresh: bool = False) -> str:
+    with span("detect_input"):
+        clean_input = input_text.strip()
+        url_input = is_url(clean_input)
+        # boilerplate learning counts each site once, however many of its pages we see
+        current_source.set(urlsplit(clean_input).hostname if url_input else None)
     
     # 1. Check if it looks like a URL (starts with http/https)
-    is_url = clean_input.lower().startswith(("http://", "https://"))
-    
-    if is_url:
+    if url_input:
         print("🚀 DETECTED URL -> Fetching content...", flush=True)
-        return fetch_from_yellowcake(clean_input)
+        return await fetch_policy_text(clean_input, refresh=refresh)
     
     # Otherwise, it's pasted text
     print("📝 DETECTED TEXT -> Analyzing directly.", flush=True)
     return input_text
 
+def check_mode(mode: Optional[str]) -> str:
+    try:
+        return resolve_extraction_mode(mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def raise_for_llm_error(report: Dict[str, Any]):
+    """A failed analysis must not reach users as a clean 0-risk report."""
+    if "error" not in report:
+        return
+    if report.get("error_type") == "rate_limited":
+        raise HTTPException(status_code=429, detail="Error: LLM_RATE_LIMITED", headers={"Retry-After": "30"})
+    raise HTTPException(status_code=503, detail=f"Error: Analysis failed ({report['error']})")
+
+def with_timings(report: Dict[str, Any], timings: Optional[list], started: float) -> Dict[str, Any]:
+    """Copy of `report` with the request's stage timings in meta (reports may be shared/cached)."""
+    if timings is None:
+        return report
+    meta = dict(report.get("meta") or {})
+    meta["timings"] = {"total_ms": round((time.perf_counter() - started) * 1000, 1), "stages": timing_breakdown(timings)}
+    return {**report, "meta": meta}
+
+async def analyze_input(input_text: str, mode: Optional[str] = None, refresh: bool = False,
+                        offline: bool = False, include_text: bool = False) -> Dict[str, Any]:
+    final_text = await process_input(input_text, refresh)
+    report = await call_llm_extract(final_text, mode, offline=offline, with_text=include_text)
+    raise_for_llm_error(report)
+    return report
+
+async def json_response(request: Request, payload: Dict[str, Any]) -> Response:
+    """conditional_json in a worker thread: serializing and hashing a large report is CPU work."""
+    return await asyncio.to_thread(conditional_json, request, payload)
+
+def flag_ids(findings: List[Dict[str, Any]]) -> List[str]:
+    return [f["flag"] for f in findings]
+
 @app.post("/api/analyze")
-def analyze(req: AnalyzeRequest) -> Dict[str, Any]:
-    final_text = process_input(req.text)
-    llm_result = call_llm_extract(final_text)
-    return llm_result
+async def analyze(req: AnalyzeRequest, request: Request) -> Response:
+    """The report as JSON, with an ETag; If-None-Match with that ETag gets a 304."""
+    return await json_response(request, await run_analyze(req))
 
-@app.post("/api/compare")
-def compare(req: CompareRequest) -> Dict[str, Any]:
-    print("\n--- NEW COMPARISON REQUEST ---", flush=True)
-    processed_A = process_input(req.textA)
-    processed_B = process_input(req.textB)
+async def run_analyze(req: AnalyzeRequest) -> Dict[str, Any]:
+    started = time.perf_counter()
+    timings = start_request_timings() if req.timings else None
+    mode = check_mode(req.mode)
+    doc_id = req.document_id
+    if not doc_id and req.track_versions and is_url(req.text):
+        doc_id = req.text.strip()
+    if doc_id and not req.offline:
+        final_text = await process_input(req.text, req.refresh)
+        report = await analyze_versioned(doc_id, final_text, mode, with_text=req.include_text)
+        raise_for_llm_error(report)
+    else:
+        report = await analyze_input(req.text, mode, req.refresh, req.offline, req.include_text)
+    return with_timings(report, timings, started)
 
-    # Analyze separately to avoid schema complexity errors
-    reportA = call_llm_extract(processed_A)
-    reportB = call_llm_extract(processed_B)
-    
-    findingsA = {f["flag"]: f for f in reportA["findings"]}
-    findingsB = {f["flag"]: f for f in reportB["findings"]}
-    
-    common_risks = []
-    unique_to_A = []
-    unique_to_B = []
+@app.post("/api/analyze/stream")
+async def analyze_stream(req: AnalyzeRequest) -> StreamingResponse:
+    """
+    Same analysis as /api/analyze, reported stage by stage as Server-Sent Events:
+    fetched, cleaned, guardrails, cache_hit, partial (per shard/chunk), then final or error.
+    """
+    mode = check_mode(req.mode)
+    queue: asyncio.Queue = asyncio.Queue()
 
-    all_flags = set(findingsA.keys()).union(set(findingsB.keys()))
+    async def on_event(name: str, payload: Dict[str, Any]):
+        await queue.put((name, payload))
 
-    for flag_id in all_flags:
-        fA = findingsA.get(flag_id)
-        fB = findingsB.get(flag_id)
-        is_risk_A = fA and fA["status"] == "true"
-        is_risk_B = fB and fB["status"] == "true"
+    async def run():
+        try:
+            text = await process_input(req.text, req.refresh)
+            await on_event("fetched", {"source": "url" if is_url(req.text) else "text", "chars": len(text)})
+            result = await call_llm_extract(text, mode, on_event=on_event, offline=req.offline,
+                                            with_text=req.include_text)
+            await on_event("error" if "error" in result else "final", result)
+        except HTTPException as he:
+            await on_event("error", {"error": he.detail})
+        except Exception as e:
+            await on_event("error", {"error": str(e)})
+        finally:
+            await queue.put(None)
 
-        if is_risk_A and is_risk_B:
-            common_risks.append(fA) 
-        elif is_risk_A and not is_risk_B:
-            unique_to_A.append(fA)
-        elif is_risk_B and not is_risk_A:
-            unique_to_B.append(fB)
+    async def stream():
+        task = asyncio.ensure_future(run())
+        try:
+            while (event := await queue.get()) is not None:
+                name, payload = event
+                yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            task.cancel()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(req: BatchRequest) -> StreamingResponse:
+    """
+    Analyze many policies and stream one NDJSON line per item, in completion order.
+    Identical items run once; each line carries the item's index in the request.
+    """
+    mode = check_mode(req.mode)
+    if len(req.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Error: Batch limited to {BATCH_MAX_ITEMS} items.")
+
+    positions: Dict[str, List[int]] = {}
+    for index, item in enumerate(req.items):
+        positions.setdefault(item.strip(), []).append(index)
+
+    fetch_limit = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+    llm_limit = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def run(item: str):
+        current_priority.set(BATCH)  # interactive requests go first
+        try:
+            if is_url(item):
+                async with fetch_limit:
+                    text = await process_input(item, req.refresh)
+            else:
+                text = item
+            report = await call_llm_extract(text, mode, limit=llm_limit)
+            raise_for_llm_error(report)
+            return item, {"result": report}
+        except HTTPException as he:
+            return item, {"error": he.detail}
+        except Exception as e:
+            return item, {"error": str(e)}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run(item)) for item in positions]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item, outcome = await next_done
+                for index in positions[item]:
+                    yield json.dumps({"index": index, **outcome}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    print(f"📦 Batch: {len(req.items)} items ({len(positions)} unique)", flush=True)
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def check_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Error: Admin endpoints are disabled (set EVIDENTIA_ADMIN_TOKEN).")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Error: Admin token required.")
+
+@app.post("/api/admin/rescore")
+def admin_rescore(dry_run: bool = False, x_admin_token: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Re-score cached reports under the current FLAG_WEIGHTS / MAX_RISK_BASELINE (no LLM calls)."""
+    check_admin(x_admin_token)
+    return rescore_cache(dry_run=dry_run)
+
+@app.get("/api/versions/{document_id:path}")
+def versions(document_id: str) -> Dict[str, Any]:
+    return {"document_id": document_id, "versions": VERSION_STORE.history(document_id)}
+
+@app.post("/api/compare")
+async def compare(req: CompareRequest, request: Request) -> Response:
+    return await json_response(request, await run_compare(req))
+
+async def run_compare(req: CompareRequest) -> Dict[str, Any]:
+    print("\n--- NEW COMPARISON REQUEST ---", flush=True)
+    started = time.perf_counter()
+    timings = start_request_timings() if req.timings else None
+    mode = check_mode(req.mode)
+    # Analyze separately to avoid schema complexity errors.
+    # Both sides (fetch + LLM) run concurrently, so latency is the slower side.
+    reportA, reportB = await asyncio.gather(
+        analyze_input(req.textA, mode, req.refresh, req.offline),
+        analyze_input(req.textB, mode, req.refresh, req.offline),
+    )
+    
+    common_risks, unique_to_A, unique_to_B = diff_findings(reportA["findings"], reportB["findings"])
+    if req.compact:  # the full findings are already in reportA/reportB
+        common_risks, unique_to_A, unique_to_B = map(flag_ids, (common_risks, unique_to_A, unique_to_B))
 
     scoreA = reportA["overall_score"]
     scoreB = reportB["overall_score"]
     
-    return {
+    result = {
         "reportA": reportA,
         "reportB": reportB,
         "comparison": {
@@ -146,4 +350,86 @@ def compare(req: CompareRequest) -> Dict[str, Any]:
             "unique_to_A": unique_to_A,
             "unique_to_B": unique_to_B
         }
-    }
\ No newline at end of file
+    }
+    if timings is not None:
+        result["meta"] = with_timings({}, timings, started)["meta"]
+    return result
+
+@app.post("/api/compare/multi")
+async def compare_multi(req: MultiCompareRequest, request: Request) -> Response:
+    """
+    Compare N policies: each unique one is analyzed once (in parallel, through the
+    cache), then ranked and cross-tabulated. Cost is linear in N, not in pairs.
+    """
+    mode = check_mode(req.mode)
+    if not 2 <= len(req.items) <= MULTI_COMPARE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Error: Compare between 2 and {MULTI_COMPARE_MAX_ITEMS} policies.")
+    if req.labels is not None and len(req.labels) != len(req.items):
+        raise HTTPException(status_code=400, detail="Error: Provide one label per item.")
+    labels = req.labels or [
+        item.strip() if is_url(item) else f"Policy {index + 1}" for index, item in enumerate(req.items)
+    ]
+
+    unique_items = list(dict.fromkeys(item.strip() for item in req.items))
+    print(f"\n--- NEW MULTI COMPARISON: {len(req.items)} policies ({len(unique_items)} unique) ---", flush=True)
+    outcomes = await asyncio.gather(
+        *(analyze_input(item, mode, req.refresh) for item in unique_items), return_exceptions=True
+    )
+    by_item = dict(zip(unique_items, outcomes))
+
+    policies, ok_labels, ok_reports = [], [], []
+    for index, item in enumerate(req.items):
+        outcome = by_item[item.strip()]
+        if isinstance(outcome, HTTPException):
+            policies.append({"index": index, "label": labels[index], "error": outcome.detail})
+        elif isinstance(outcome, BaseException):
+            policies.append({"index": index, "label": labels[index], "error": str(outcome)})
+        else:
+            policies.append({"index": index, "label": labels[index], "report": outcome})
+            ok_labels.append(labels[index])
+            ok_reports.append(outcome)
+    if len(ok_reports) < 2:
+        errors = "; ".join(f"{p['label']}: {p['error']}" for p in policies if "error" in p)
+        raise HTTPException(status_code=400, detail=f"Error: Fewer than two policies could be analyzed ({errors})")
+
+    comparison = await asyncio.to_thread(build_comparison, ok_labels, ok_reports)
+    # build_comparison indexes the analyzed policies; map back to request positions
+    positions = [p["index"] for p in policies if "report" in p]
+    for entry in comparison["ranking"] + comparison["unique_risks"]:
+        entry["index"] = positions[entry["index"]]
+    if req.compact:
+        comparison["common_risks"] = flag_ids(comparison["common_risks"])
+        for entry in comparison["unique_risks"]:
+            entry["risks"] = flag_ids(entry["risks"])
+    return await json_response(request, {"policies": policies, "comparison": comparison})
+
+# --- BACKGROUND JOBS ---
+# Same handlers as the synchronous endpoints, so jobs share the result cache,
+# single-flight and the LLM scheduler (at background priority).
+JOB_REQUESTS = {"analyze": (AnalyzeRequest, run_analyze), "compare": (CompareRequest, run_compare)}
+
+for _kind, (_model, _endpoint) in JOB_REQUESTS.items():
+    JOB_RUNNER.register(_kind, lambda payload, model=_model, endpoint=_endpoint: endpoint(model(**payload)))
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(req: JobRequest) -> Dict[str, Any]:
+    """Queue an analyze/compare request; poll GET /api/jobs/{id} for the result."""
+    if req.type not in JOB_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"Error: Unknown job type '{req.type}'.")
+    model, _ = JOB_REQUESTS[req.type]
+    try:
+        payload = model(**req.payload)
+    except ValidationError as e:
+        first = e.errors()[0]
+        field = ".".join(str(part) for part in first["loc"])
+        raise HTTPException(status_code=400, detail=f"Error: Invalid {req.type} payload: {field}: {first['msg']}")
+    check_mode(payload.mode)
+    return await JOB_RUNNER.submit(req.type, payload.model_dump())
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str, request: Request) -> Response:
+    """Pollers that send the last ETag back get a 304 until the job changes."""
+    job = JOB_RUNNER.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Error: Job not found.")
+    return conditional_json(request, job)
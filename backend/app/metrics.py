@@ -0,0 +1,198 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- METRICS ---
+# Minimal Prometheus-style counters/histograms, rendered in the text exposition
+# format on /api/metrics. `span(stage)` times one pipeline stage; when a request
+# asked for it, the same timings are also collected into its response meta.
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_text(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """For totals counted elsewhere (e.g. mirrored from a .stats() dict)."""
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def lines(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def lines(self) -> list:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _label_text(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        out = []
+        for metric in self._metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "evidentia_stage_seconds", "Time spent per pipeline stage.", ("stage",)))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "evidentia_http_requests_total", "HTTP requests by route and status.", ("route", "status")))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "evidentia_http_request_seconds", "Time to response headers by route.", ("route",)))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "evidentia_llm_tokens_total", "Gemini tokens reported in usage_metadata.", ("direction",)))
+LLM_CALLS = REGISTRY.register(Counter(
+    "evidentia_llm_calls_total", "Gemini calls that returned a response.", ("kind",)))
+ERRORS = REGISTRY.register(Counter(
+    "evidentia_errors_total", "Failures by type.", ("type",)))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "evidentia_cache_lookups_total", "Cache lookups by cache and outcome.", ("cache", "outcome")))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "evidentia_cache_hit_ratio", "Share of cache lookups that hit.", ("cache",)))
+LLM_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "evidentia_llm_queue_depth", "LLM calls waiting for a scheduler slot.", ("priority",)))
+LLM_CONCURRENCY = REGISTRY.register(Gauge(
+    "evidentia_llm_concurrency", "Current adaptive LLM concurrency cap."))
+NORMALIZE_BYTES_REMOVED = REGISTRY.register(Counter(
+    "evidentia_normalize_bytes_removed_total", "Input bytes removed before the LLM, by normalization stage.", ("stage",)))
+
+
+# --- SPANS & PER-REQUEST TIMINGS ---
+# None unless the current request asked for a breakdown; inherited by the tasks it starts.
+current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def start_request_timings() -> list:
+    timings = []
+    current_timings.set(timings)
+    return timings
+
+
+def timing_breakdown(timings: list) -> dict:
+    """{stage: {"ms": total, "count": n}} in first-seen order. Concurrent stages overlap."""
+    breakdown = {}
+    for stage, elapsed in timings:
+        entry = breakdown.setdefault(stage, {"ms": 0.0, "count": 0})
+        entry["ms"] += elapsed * 1000
+        entry["count"] += 1
+    for entry in breakdown.values():
+        entry["ms"] = round(entry["ms"], 1)
+    return breakdown
+
+
+def record_llm_usage(response, kind: str):
+    LLM_CALLS.inc(kind=kind)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_token_count", None) or 0, direction="input")
+    LLM_TOKENS.inc(getattr(usage, "candidates_token_count", None) or 0, direction="output")
+
+
+def record_cache_stats(name: str, stats: dict):
+    """Mirror a ResultCache.stats() dict into the cache metrics."""
+    CACHE_LOOKUPS.set(stats["hits_memory"], cache=name, outcome="hit_memory")
+    CACHE_LOOKUPS.set(stats["hits_disk"], cache=name, outcome="hit_disk")
+    CACHE_LOOKUPS.set(stats["misses"], cache=name, outcome="miss")
+    CACHE_HIT_RATIO.set(stats["hit_ratio"], cache=name)
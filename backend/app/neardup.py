@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import hashlib
+import threading
+
+from cache import CACHE_PATH, open_sqlite
+from context import split_paragraphs
+from normalize import mentions_policy
+
+# --- NEAR-DUPLICATE INDEX ---
+# SimHash fingerprints of previously analyzed (cleaned) texts, bucketed for LSH.
+# A policy that only differs by a date, whitespace or a few words lands within
+# a small Hamming distance of the earlier version, and its result can be reused.
+# SimHash can't tell "we do not sell" from "we sell", so a match also has to
+# agree on every paragraph that talks about the policy's subject (policy_digest):
+# only edits to dates, headings, navigation and the like are reused.
+
+NEAR_DUP_ENABLED = os.getenv("EVIDENTIA_NEAR_DUP", "1") != "0"
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("EVIDENTIA_NEAR_DUP_MAX_DISTANCE", "3"))
+
+FINGERPRINT_BITS = 64
+BANDS = 4  # 4 bands of 16 bits: any fingerprint within distance 3 shares a band
+BAND_BITS = FINGERPRINT_BITS // BANDS
+SHINGLE_SIZE = 3
+WORD_RE = re.compile(r"[a-z0-9]+")
+DATE_PARTS_RE = re.compile(
+    r"\d+|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b(?=\W+\d)"  # "Last updated: March 3, 2024"
+)
+
+
+def simhash(text: str) -> int:
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = set(words)
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    if not shingles:
+        return 0
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    half = len(hashes) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if sum((h >> bit) & 1 for h in hashes) > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def policy_digest(text: str) -> str:
+    """Hash of the set of paragraphs with policy vocabulary, case, whitespace and dates folded."""
+    paragraphs = {
+        DATE_PARTS_RE.sub("0", " ".join(p.lower().split())) for p in split_paragraphs(text) if mentions_policy(p)
+    }
+    return hashlib.blake2b("\n".join(sorted(paragraphs)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def bands(fingerprint: int) -> list:
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    """
+    Fingerprints stored in the shared SQLite cache file. `scope` is the cache-key
+    prefix (kind, model, rubric fingerprints), so a match is only ever reused
+    under the same rules it was computed with.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_distance: int = NEAR_DUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.lookups = 0
+        self.hits = 0
+        self.refused = 0  # within distance, but a policy paragraph differs
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path) if path else open_sqlite(":memory:")
+        band_columns = ", ".join(f"b{i} INTEGER NOT NULL" for i in range(BANDS))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS neardup ("
+            "text_hash TEXT NOT NULL, scope TEXT NOT NULL, fingerprint INTEGER NOT NULL, "
+            f"result_key TEXT NOT NULL, created REAL NOT NULL, {band_columns}, "
+            "policy_digest TEXT, PRIMARY KEY (scope, text_hash))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(neardup)")}
+        if "policy_digest" not in columns:  # rows from before the digest never match
+            self._conn.execute("ALTER TABLE neardup ADD COLUMN policy_digest TEXT")
+        for i in range(BANDS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS neardup_b{i} ON neardup (scope, b{i})")
+
+    def add(self, text_hash: str, fingerprint: int, scope: str, result_key: str, digest: str):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO neardup (text_hash, scope, fingerprint, result_key, created, policy_digest, "
+                f"{', '.join(f'b{i}' for i in range(BANDS))}) VALUES (?, ?, ?, ?, ?, ?{', ?' * BANDS})",
+                (text_hash, scope, _to_signed(fingerprint), result_key, time.time(), digest, *bands(fingerprint)),
+            )
+
+    def find(self, fingerprint: int, scope: str, digest: str, exclude: str = None):
+        """Closest stored text within max_distance with the same policy_digest: (text_hash, result_key, distance) or None."""
+        where = " OR ".join(f"b{i} = ?" for i in range(BANDS))
+        with self._lock:
+            self.lookups += 1
+            rows = self._conn.execute(
+                f"SELECT text_hash, result_key, fingerprint, policy_digest FROM neardup WHERE scope = ? AND ({where})",
+                (scope, *bands(fingerprint)),
+            ).fetchall()
+        best, refused = None, False
+        for text_hash, result_key, stored, stored_digest in rows:
+            if text_hash == exclude:
+                continue
+            distance = hamming(fingerprint, _to_unsigned(stored))
+            if distance > self.max_distance:
+                continue
+            if stored_digest != digest:
+                refused = True
+                continue
+            if best is None or distance < best[2]:
+                best = (text_hash, result_key, distance)
+        if best is not None:
+            self.hits += 1
+        elif refused:
+            self.refused += 1
+        return best
+
+    def rescope(self, old_scope: str, new_scope: str) -> int:
+        """Move entries to a new scope (e.g. after cached results were re-keyed)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE OR REPLACE neardup SET scope = ?, result_key = ? || substr(result_key, ?) WHERE scope = ?",
+                (new_scope, new_scope, len(old_scope) + 1, old_scope),
+            )
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM neardup").fetchone()[0]
+        return {
+            "enabled": NEAR_DUP_ENABLED,
+            "max_distance": self.max_distance,
+            "entries": entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "refused": self.refused,
+        }
@@ -0,0 +1,323 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from cache import CACHE_PATH, open_sqlite
+from chunking import is_heading
+from guardrails import GUARDRAILS, TOPIC_VOCABULARY
+
+# --- TEXT NORMALIZATION ---
+# Scraped policies arrive as HTML or as text full of site chrome. Three stages,
+# each a single pass over the input:
+#   html        - tags dropped by a streaming parser; script/style/nav/footer skipped
+#   rules       - blank lines and the classic nav/copyright lines
+#   boilerplate - lines learned from the corpus: short lines that sat in page chrome
+#                 (nav, footer, cookie banners) on many different sites
+#                 ("Skip to content", "Accept all", menus)
+# Every stage reports bytes in/out, so the savings in prompt tokens are visible.
+# Only fetched pages teach the model, and never a line that talks about the
+# policy's subject matter. HTML pages teach from their chrome; pages the scraper
+# already returned as text (the usual Yellowcake path) have no chrome left, so
+# their candidate fragments count instead (EVIDENTIA_BOILERPLATE_LEARN_TEXT=0
+# turns that off). Cache keys hash the text from before the learned filter, so
+# a model refresh doesn't change them.
+
+BOILERPLATE_ENABLED = os.getenv("EVIDENTIA_BOILERPLATE", "1") != "0"
+BOILERPLATE_MIN_SOURCES = int(os.getenv("EVIDENTIA_BOILERPLATE_MIN_SOURCES", "5"))
+BOILERPLATE_MAX_LINE = int(os.getenv("EVIDENTIA_BOILERPLATE_MAX_LINE", "120"))
+BOILERPLATE_REFRESH_SECONDS = float(os.getenv("EVIDENTIA_BOILERPLATE_REFRESH", "300"))
+BOILERPLATE_LEARN_TEXT = os.getenv("EVIDENTIA_BOILERPLATE_LEARN_TEXT", "1") != "0"
+BOILERPLATE_LINES_PER_DOC = 2000  # bounds the learning write per document
+
+HTML_HINT_RE = re.compile(
+    r"<(?:!doctype|html|head|body|div|p|br|span|a|ul|ol|li|table|section|article|main|h[1-6])\b",
+    re.IGNORECASE,
+)
+DIGITS_RE = re.compile(r"\d+")
+CHROME_TAGS = {"nav", "footer", "header", "aside"}
+CHROME_ATTR_RE = re.compile(
+    r"(?:^|[\s_-])(?:nav|menu|footer|cookie|consent|banner|breadcrumb|toolbar|skip|masthead|contentinfo)",
+    re.IGNORECASE,
+)
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# A line that mentions what policies are about is never boilerplate, however
+# many sites share it ("IP address", "Email address", "Precise geolocation").
+POLICY_VOCAB_RE = re.compile(
+    "|".join([p for table in (GUARDRAILS, TOPIC_VOCABULARY) for patterns in table.values() for p in patterns] + [
+        r"data", r"information", r"personal", r"privacy", r"collect", r"shar", r"consent", r"rights?\b",
+        r"categor", r"third[- ]part", r"process", r"opt[- ]out", r"geoloc",
+    ])
+)  # lowercase patterns, matched against lowercased text: much faster than IGNORECASE
+
+
+def mentions_policy(text: str) -> bool:
+    return POLICY_VOCAB_RE.search(text.lower()) is not None
+
+
+# Site that the text being normalized came from (hostname), set by the caller;
+# documents without one (pasted text) are filtered but never learned from.
+current_source = contextvars.ContextVar("normalize_source", default=None)
+
+
+# --- STAGE 1: HTML ---
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+    LAYOUT = {"nav", "footer"}
+    BLOCKS = {
+        "p", "div", "br", "hr", "li", "ul", "ol", "dl", "dt", "dd", "tr", "table", "section", "article",
+        "main", "aside", "header", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "title", "form",
+    }
+
+    def __init__(self, drop_layout: bool):
+        super().__init__(convert_charrefs=True)
+        self.drop_layout = drop_layout
+        self.depth = 0  # nesting inside skipped elements
+        self.chrome = []  # open chrome elements: [tag, nesting of that tag]
+        self.pieces = []
+        self.chrome_pieces = []  # text inside chrome: what the boilerplate model learns from
+
+    def _is_chrome(self, tag, attrs) -> bool:
+        if tag in CHROME_TAGS:
+            return True
+        return any(
+            name in ("class", "id", "role", "aria-label") and value and CHROME_ATTR_RE.search(value)
+            for name, value in attrs
+        )
+
+    def _in_layout(self) -> bool:
+        return self.drop_layout and any(tag in self.LAYOUT for tag, _ in self.chrome)
+
+    def _newline(self):
+        self.pieces.append("\n")
+        if self.chrome:
+            self.chrome_pieces.append("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.depth += 1
+            return
+        if self.chrome and tag == self.chrome[-1][0]:
+            self.chrome[-1][1] += 1
+        elif tag not in VOID_TAGS and self._is_chrome(tag, attrs):
+            self.chrome.append([tag, 1])
+        if tag in self.BLOCKS:
+            self._newline()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.BLOCKS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.depth = max(0, self.depth - 1)
+            return
+        if tag in self.BLOCKS:
+            self._newline()
+        if self.chrome and tag == self.chrome[-1][0]:
+            self.chrome[-1][1] -= 1
+            if not self.chrome[-1][1]:
+                self.chrome.pop()
+
+    def handle_data(self, data):
+        if self.depth:
+            return
+        if self.chrome:
+            self.chrome_pieces.append(data)
+        if not self._in_layout():
+            self.pieces.append(data)
+
+
+def looks_like_html(text: str) -> bool:
+    return bool(HTML_HINT_RE.search(text))
+
+
+def _collapse(pieces: list) -> str:
+    lines = (" ".join(line.split()) for line in "".join(pieces).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def extract_html(text: str, drop_layout: bool = True, chunk_size: int = 65536):
+    """(visible text, chrome text) of an HTML page, one block element per line, whitespace collapsed."""
+    parser = _TextExtractor(drop_layout)
+    for offset in range(0, len(text), chunk_size):
+        parser.feed(text[offset:offset + chunk_size])
+    parser.close()
+    stripped = _collapse(parser.pieces)
+    if drop_layout and len(stripped) < 200 <= len(text) // 10:
+        return extract_html(text, drop_layout=False, chunk_size=chunk_size)  # unclosed <nav> ate the page
+    return stripped, _collapse(parser.chrome_pieces)
+
+
+def strip_html(text: str, drop_layout: bool = True, chunk_size: int = 65536) -> str:
+    """Visible text of an HTML page, one block element per line, whitespace collapsed."""
+    return extract_html(text, drop_layout, chunk_size)[0]
+
+
+# --- STAGE 2: FIXED RULES ---
+def rule_filter(lines: list) -> list:
+    kept = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        # Remove navigation/menu lines
+        if len(stripped) < 40 and ("Home" in stripped or "About" in stripped or "Contact" in stripped or "Login" in stripped):
+            continue
+        # Remove copyright/footer junk
+        lowered = stripped.lower()
+        if "rights reserved" in lowered or "copyright" in lowered or "©" in stripped:
+            continue
+        kept.append(line)
+    return kept
+
+
+# --- STAGE 3: CORPUS-LEARNED BOILERPLATE ---
+def line_key(line: str):
+    """Hash of a boilerplate candidate line, or None if the line must never be dropped."""
+    stripped = line.strip()
+    if not 2 <= len(stripped) <= BOILERPLATE_MAX_LINE:
+        return None
+    # Sentences may be policy statements and headings structure the document;
+    # only fragments (menu items, buttons, banner labels) are candidates.
+    if stripped.endswith((".", "!", "?", ";", ":")) or is_heading(stripped) or mentions_policy(stripped):
+        return None
+    normalized = DIGITS_RE.sub("0", " ".join(stripped.lower().split()))
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class BoilerplateModel:
+    """
+    Distinct-source counts per candidate line in the shared SQLite file. A line is
+    boilerplate once BOILERPLATE_MIN_SOURCES different sites had it in their chrome
+    (or, for pages fetched as text, anywhere on the page). The
+    learned set is read into memory and refreshed every BOILERPLATE_REFRESH_SECONDS,
+    so filtering is a set lookup per line and cleaned text stays stable in between.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, min_sources: int = BOILERPLATE_MIN_SOURCES,
+                 refresh: float = BOILERPLATE_REFRESH_SECONDS):
+        self.min_sources = min_sources
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path or ":memory:")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS boilerplate_lines ("
+            "hash TEXT PRIMARY KEY, sources INTEGER NOT NULL, sample TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS boilerplate_sources ("
+            "hash TEXT NOT NULL, source TEXT NOT NULL, PRIMARY KEY (hash, source)) WITHOUT ROWID"
+        )
+        self._learned = frozenset()
+        self._loaded = float("-inf")
+        self._observed = OrderedDict()  # (source, document hash) already counted by this process
+
+    def learned(self) -> frozenset:
+        if time.monotonic() - self._loaded > self.refresh:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT hash FROM boilerplate_lines WHERE sources >= ?", (self.min_sources,)
+                ).fetchall()
+            self._learned = frozenset(h for (h,) in rows)
+            self._loaded = time.monotonic()
+        return self._learned
+
+    def observe(self, keyed_lines: dict, source: str, doc_hash: str):
+        """Count `source` once for each of its candidate lines ({hash: line})."""
+        marker = (source, doc_hash)
+        if marker in self._observed:
+            return
+        self._observed[marker] = True
+        if len(self._observed) > 4096:
+            self._observed.popitem(last=False)
+
+        learned = self._learned
+        rows = [(h, line.strip()) for h, line in keyed_lines.items() if h not in learned]
+        rows = rows[:BOILERPLATE_LINES_PER_DOC]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, sample in rows:
+                    inserted = self._conn.execute(
+                        "INSERT OR IGNORE INTO boilerplate_sources (hash, source) VALUES (?, ?)", (key, source)
+                    ).rowcount
+                    if inserted:
+                        self._conn.execute(
+                            "INSERT INTO boilerplate_lines (hash, sources, sample) VALUES (?, 1, ?) "
+                            "ON CONFLICT(hash) DO UPDATE SET sources = sources + 1",
+                            (key, sample),
+                        )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def top(self, limit: int = 20) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sample, sources FROM boilerplate_lines ORDER BY sources DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"line": sample, "sources": sources} for sample, sources in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked = self._conn.execute("SELECT COUNT(*) FROM boilerplate_lines").fetchone()[0]
+        return {"tracked_lines": tracked, "learned_lines": len(self.learned()), "min_sources": self.min_sources}
+
+
+BOILERPLATE_MODEL = BoilerplateModel() if BOILERPLATE_ENABLED else None
+
+
+# --- PIPELINE ---
+class NormalizedText:
+    __slots__ = ("text", "stages", "key_text")
+
+    def __init__(self, text: str, stages: list, key_text: str = None):
+        self.text = text
+        self.stages = stages  # [{"stage", "bytes_in", "bytes_out", "removed"}]
+        self.key_text = text if key_text is None else key_text  # before the learned filter: hash this for cache keys
+
+    def bytes_removed(self) -> dict:
+        return {s["stage"]: s["removed"] for s in self.stages}
+
+
+def _stage(stages: list, name: str, bytes_in: int, text: str) -> int:
+    bytes_out = len(text.encode("utf-8"))
+    stages.append({"stage": name, "bytes_in": bytes_in, "bytes_out": bytes_out, "removed": bytes_in - bytes_out})
+    return bytes_out
+
+
+def normalize_text(text: str, model: BoilerplateModel = None, learn: bool = True) -> NormalizedText:
+    """Run every stage over `text`. `learn=False` filters without counting this document."""
+    model = model or BOILERPLATE_MODEL
+    stages = []
+    size = len(text.encode("utf-8"))
+
+    chrome = ""
+    if looks_like_html(text):
+        text, chrome = extract_html(text)
+    size = _stage(stages, "html", size, text)
+
+    lines = rule_filter(text.split("\n"))
+    text = key_text = "\n".join(lines)
+    size = _stage(stages, "rules", size, text)
+
+    if model is not None:
+        source = current_source.get()
+        # Fetched HTML teaches from its chrome; fetched text from its own fragments.
+        taught = chrome.split("\n") if chrome else (lines if BOILERPLATE_LEARN_TEXT else ())
+        if learn and source and taught:
+            keyed = {key: line for key, line in ((line_key(line), line) for line in taught) if key is not None}
+            model.observe(keyed, source, hashlib.md5(text.encode("utf-8")).hexdigest())
+        learned = model.learned()
+        if learned:
+            text = "\n".join(line for line in lines if line_key(line) not in learned)
+    _stage(stages, "boilerplate", size, text)
+    return NormalizedText(text, stages, key_text)
@@ -0,0 +1,134 @@
+import json
+from functools import lru_cache
+
+# --- PROMPT & SCHEMA REGISTRY ---
+# Everything a Gemini call needs except the policy text: definitions, prompt
+# templates, response schemas and GenerateContentConfig objects. Each flag set
+# (all flags, one shard's category, a guardrail-pruned subset) is built once and
+# memoized, so a request only formats its text into a ready template. Returned
+# schemas and configs are shared between requests: treat them as read-only.
+# google.genai is imported on first use, not at startup (see llm.get_client).
+
+# --- DEFINITIONS & NEGATIVE CONSTRAINTS ---
+DEFINITIONS = {
+    "uses_cookies": "Mentions 'cookies', 'pixels', 'web beacons'. IGNORE: 'cookie-cutter' or food.",
+    "collects_location": "Mentions 'GPS', 'lat/long', 'physical address'. IGNORE: 'IP address' (that is separate).",
+    "collects_ip_address": "Explicitly mentions collecting 'IP address'.",
+    "collects_device_info": "Mentions 'device ID', 'MAC address', 'browser type'.",
+    "shares_for_advertising": "Mentions sharing with 'ad partners', 'marketing partners'. IGNORE: Internal marketing.",
+    "uses_targeted_ads": "Mentions 'interest-based ads', 'profiling'. IGNORE: Contextual ads.",
+    "uses_cross_site_tracking": "Mentions 'tracking across other websites', 'third-party cookies'.",
+    "sells_user_data": "Explicitly mentions 'selling' data. IF TEXT SAYS 'WE DO NOT SELL', THIS IS FALSE.",
+    "shares_with_data_brokers": "Mentions 'data brokers', 'aggregators'.",
+    "indefinite_data_retention": "Says data is kept 'indefinitely' or 'as long as necessary' with NO specific timeframe.",
+    "waives_rights": "Mentions 'class action waiver', 'jury trial waiver'. IGNORE: General 'legal rights'.",
+    "collects_children_data": "Mentions collecting data from children under 13/16. IF TEXT SAYS 'WE DO NOT knowingly collect', THIS IS FALSE.",
+}
+
+EXTRACT_PROMPT = (
+    "\n"
+    "    Analyze the LEGAL TEXT below. \n"
+    "    IGNORE any website navigation, footers, or marketing text. Focus ONLY on the privacy policy clauses.\n"
+    "    \n"
+    "    Definitions: {definitions}\n"
+    "    \n"
+    "    Text: \n"
+    "    {policy_text}\n"
+    "    "
+)
+
+COMPARE_PROMPT = (
+    "\n"
+    "    You are an impartial legal judge. Compare these two privacy policies side-by-side.\n"
+    "    \n"
+    "    INSTRUCTIONS:\n"
+    "    1. IGNORE website noise (headers, footers, navigation menus).\n"
+    "    2. Focus ONLY on the legal clauses.\n"
+    "    3. Consistency is CRITICAL. If A and B contain similar text, their flags MUST match.\n"
+    "    \n"
+    "    DEFINITIONS:\n"
+    "    {definitions}\n"
+    "\n"
+    "    ----- POLICY A START -----\n"
+    "    {policy_a}\n"
+    "    ----- POLICY A END -----\n"
+    "\n"
+    "    ----- POLICY B START -----\n"
+    "    {policy_b}\n"
+    "    ----- POLICY B END -----\n"
+    "    "
+)
+
+
+def definitions_for(flag_keys) -> dict:
+    return {k: v for k, v in DEFINITIONS.items() if k in flag_keys}
+
+
+@lru_cache(maxsize=256)
+def definitions_json(flag_keys: tuple, indent: int = None) -> str:
+    return json.dumps(definitions_for(flag_keys), indent=indent)
+
+
+@lru_cache(maxsize=256)
+def flag_schema(flag_keys: tuple) -> dict:
+    properties = {}
+    for flag_id in flag_keys:
+        properties[flag_id] = {
+            "type": "object",
+            "properties": {"present": {"type": "boolean"}, "evidence": {"type": "string"}},
+            "required": ["present"]
+        }
+    return {"type": "object", "properties": properties, "required": list(flag_keys)}
+
+
+@lru_cache(maxsize=256)
+def comparison_schema(flag_keys: tuple) -> dict:
+    single_policy_schema = flag_schema(flag_keys)
+    return {
+        "type": "object",
+        "properties": {
+            "policy_A": single_policy_schema,
+            "policy_B": single_policy_schema
+        },
+        "required": ["policy_A", "policy_B"]
+    }
+
+
+@lru_cache(maxsize=256)
+def extract_config(flag_keys: tuple):
+    from google.genai import types
+    return types.GenerateContentConfig(
+        temperature=0.0,
+        top_k=1, # DETERMINISTIC
+        response_mime_type="application/json",
+        response_schema=flag_schema(flag_keys)
+    )
+
+
+@lru_cache(maxsize=256)
+def compare_config(flag_keys: tuple):
+    from google.genai import types
+    return types.GenerateContentConfig(
+        temperature=0.0,
+        top_k=1, # DETERMINISTIC
+        max_output_tokens=8192,
+        response_mime_type="application/json",
+        response_schema=comparison_schema(flag_keys)
+    )
+
+
+def build_extract_prompt(policy_text: str, flag_keys) -> str:
+    return EXTRACT_PROMPT.format(definitions=definitions_json(tuple(flag_keys)), policy_text=policy_text)
+
+
+def build_compare_prompt(policy_a: str, policy_b: str, flag_keys) -> str:
+    return COMPARE_PROMPT.format(
+        definitions=definitions_json(tuple(flag_keys), indent=2), policy_a=policy_a, policy_b=policy_b
+    )
+
+
+def registry_stats() -> dict:
+    return {
+        name: fn.cache_info().currsize
+        for name, fn in (("schemas", flag_schema), ("configs", extract_config), ("compare_configs", compare_config))
+    }
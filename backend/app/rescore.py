@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+
+from llm import RESULT_CACHE, NEAR_DUP_INDEX, EXTRACTION_FINGERPRINT, SCORING_FINGERPRINT
+from score import FindingsMatrix, risk_scores, score_dicts
+
+# --- BULK RE-SCORING ---
+# Cache keys carry the scoring fingerprint, so tuning FLAG_WEIGHTS or
+# MAX_RISK_BASELINE strands every cached report under the old key. Findings
+# don't depend on the weights, so entries whose *extraction* fingerprint still
+# matches are re-scored in one vectorized pass and moved to the current key,
+# without any LLM traffic.
+#
+#   python rescore.py [--dry-run]       or       POST /api/admin/rescore
+
+REPORT_KINDS = ("single", "single-sharded", "document", "document-sharded")
+PAIR_KINDS = ("compare",)
+RAW_KINDS = ("chunk", "chunk-sharded")  # raw flag maps: unscored, only re-keyed
+
+
+def parse_cache_key(key: str):
+    """(kind, model, extraction fp, scoring fp, digest), or None for foreign keys."""
+    parts = key.split(":")
+    if len(parts) < 5:
+        return None
+    return parts[0], ":".join(parts[1:-3]), parts[-3], parts[-2], parts[-1]
+
+
+def rescore_cache(cache=RESULT_CACHE, near_dup=NEAR_DUP_INDEX, dry_run: bool = False) -> dict:
+    started = time.perf_counter()
+    report = {
+        "scoring_fingerprint": SCORING_FINGERPRINT,
+        "scanned": 0,
+        "current": 0,
+        "stale_extraction": 0,
+        "rescored_reports": 0,
+        "rekeyed_entries": 0,
+        "dry_run": dry_run,
+    }
+    if cache.disk is None:
+        return {**report, "error": "no disk cache configured"}
+
+    entries = []     # (old key, new key, value, expires)
+    reports = []     # report dicts to re-score, in matrix row order
+    old_scopes = {}  # old scope -> new scope, for the near-duplicate index
+    for key, payload, expires in cache.disk.items():
+        report["scanned"] += 1
+        parsed = parse_cache_key(key)
+        if parsed is None:
+            continue
+        kind, model, extraction_fp, scoring_fp, digest = parsed
+        if scoring_fp == SCORING_FINGERPRINT:
+            report["current"] += 1
+            continue
+        if extraction_fp != EXTRACTION_FINGERPRINT:
+            report["stale_extraction"] += 1  # findings themselves are outdated: needs the LLM
+            continue
+        if kind not in REPORT_KINDS + PAIR_KINDS + RAW_KINDS:
+            continue
+
+        value = json.loads(payload)
+        if kind in REPORT_KINDS and "error" not in value:
+            reports.append(value)
+        elif kind in PAIR_KINDS and "error" not in value:
+            reports.extend(value[side] for side in ("reportA", "reportB") if side in value)
+        new_scope = f"{kind}:{model}:{extraction_fp}:{SCORING_FINGERPRINT}"
+        old_scopes[f"{kind}:{model}:{extraction_fp}:{scoring_fp}"] = new_scope
+        entries.append((key, f"{new_scope}:{digest}", value, expires))
+
+    scoring_started = time.perf_counter()
+    matrix = FindingsMatrix.from_findings([r.get("findings", []) for r in reports])
+    for target, scores in zip(reports, score_dicts(*risk_scores(matrix))):
+        target.update(scores)  # entries hold these same dicts
+    report["score_ms"] = round((time.perf_counter() - scoring_started) * 1000, 2)
+    report["rescored_reports"] = len(reports)
+    report["rekeyed_entries"] = len(entries)
+
+    if not dry_run and entries:
+        cache.disk.replace_many(
+            [(new, json.dumps(value, separators=(",", ":")), expires) for _, new, value, expires in entries],
+            [old for old, _, _, _ in entries],
+        )
+        for old, _, _, _ in entries:
+            cache.memory.delete(old)
+        report["near_duplicate_rescoped"] = sum(near_dup.rescope(old, new) for old, new in old_scopes.items())
+
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+if __name__ == "__main__":
+    result = rescore_cache(dry_run="--dry-run" in sys.argv[1:])
+    print(json.dumps(result, indent=2))
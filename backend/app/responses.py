@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+
+from fastapi import Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+
+# --- RESPONSE ENCODING ---
+# Reports are serialized once, straight to bytes (orjson when it is installed),
+# instead of going through FastAPI's jsonable_encoder + json.dumps. The ETag is
+# a hash of those bytes: a client that sends it back in If-None-Match gets a
+# bodiless 304 when the analysis hasn't changed. Compression is brotli when
+# brotli-asgi is installed, gzip otherwise; SSE streams are never buffered.
+
+COMPRESSION_MIN_BYTES = int(os.getenv("EVIDENTIA_COMPRESSION_MIN_BYTES", "1000"))
+GZIP_LEVEL = int(os.getenv("EVIDENTIA_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("EVIDENTIA_BROTLI_QUALITY", "4"))
+STREAMING_PATHS = ["/api/analyze/stream"]
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional: pip install brotli-asgi
+    BrotliMiddleware = None
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def etag_for(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def conditional_json(request: Request, payload) -> Response:
+    """JSON response with a content-hash ETag, or a 304 if the client already has it."""
+    body = dumps(payload)
+    etag = etag_for(body)
+    # no-cache: clients may store it, but must revalidate (POST bodies aren't URL-keyed)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def add_compression(app):
+    if BrotliMiddleware is not None:
+        app.add_middleware(
+            BrotliMiddleware, quality=BROTLI_QUALITY, minimum_size=COMPRESSION_MIN_BYTES,
+            gzip_fallback=True, excluded_handlers=STREAMING_PATHS,
+        )
+        return "br"
+    # Starlette's gzip leaves text/event-stream alone and flushes streamed chunks (NDJSON batches).
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES, compresslevel=GZIP_LEVEL)
+    return "gzip"
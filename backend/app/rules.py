@@ -0,0 +1,294 @@
+import os
+import re
+
+# --- LOCAL RULE CLASSIFIER ---
+# Some flags are decided by a handful of unambiguous phrases: "we use cookies",
+# "your IP address", "binding arbitration", "we do not sell your personal
+# information". Those are resolved here, sentence by sentence, with NegEx-style
+# negation detection (a negation cue in the same clause, a few words either side
+# of the phrase). A denial only counts when the cue governs the practice's own
+# verb ("we do not sell", not "we do not share ..."); any other negation near the
+# phrase makes the sentence ambiguous. A flag is only decided when the evidence
+# points one way; anything mixed, hedged ("unless", "if") or unmatched is left to Gemini. The evidence quote
+# is the sentence itself, so it always resolves to an exact span.
+
+RULES_ENABLED = os.getenv("EVIDENTIA_RULES", "1") != "0"
+MAX_RULE_QUOTE_CHARS = 600
+NEGATION_WINDOW_WORDS = 6
+MIN_FRAGMENT_WORDS = 6  # unpunctuated lines shorter than this are headings or menu items
+
+SENTENCE_RE = re.compile(r"[^.!?\n]+(?:[.!?]+|$)", re.MULTILINE)
+NEGATION_CUES = r"(?:\b(?:not(?!\s+(?:only|just)\b)|never|cannot|neither|nor)\b|n't\b)"  # "not only" affirms
+NEGATION_RE = re.compile(NEGATION_CUES, re.IGNORECASE)
+GOVERNED_GAP = r"\W+(?:\w+\W+){0,2}?"  # "not knowingly collect", "not and will not sell"
+# "cookies that are not strictly necessary", "IP address longer than 30 days",
+# "IP address for advertising", "cookies to collect personal information",
+# "email address in plain text": the denial is about a subset, a duration, a
+# purpose or a manner, not the practice itself
+RESTRICTED_RE = re.compile(
+    r"\W*(?:\w+\W+){0,2}?(?:that|which|who|whose|other than|beyond|longer|more than|after|outside"
+    r"|for|from|via|through|without|with|unless|until|directly|automatically|unencrypted|as part of"
+    r"|in (?:plain|clear)[- ]?text|in (?:an? )?(?:identifiable|readable|unencrypted) form"
+    r"|to (?!(?:the|a|an|any|anyone|this|these|that|those|such|our|your|their|its|us|you|them|others?|third|outside|affiliated)\b)[a-z]+)\b",
+    re.IGNORECASE,
+)
+# "Neither party shall ...", "No information is ...": a cue opening the clause
+# governs all of it, however far the match is from the cue
+CLAUSE_NEGATION_RE = re.compile(r"\W*(?:neither|no|none|nothing|nobody|never)\b", re.IGNORECASE)
+CLAUSE_BREAK_RE = re.compile(r"[;:()]|\b(?:but|although|though|while|whereas|which|that|who)\b", re.IGNORECASE)
+HEDGE_RE = re.compile(r"\b(?:except|unless|other than|if|whether|in the event)\b", re.IGNORECASE)
+WORD_RE = re.compile(r"\S+")
+# Every rule pattern contains one of these (lowercase) words; only sentences with
+# one are examined. Plain substring search: much faster than an alternation regex.
+TRIGGERS = (
+    "cookie", "beacon", "pixel", "ip address", "ip-address", "internet protocol", "email", "e-mail",
+    "arbitrat", "class action", "class-action", "individual basis", "sell", "sold", "child", "minor", "kid",
+)
+SENTENCE_ENDS = ".!?\n"
+
+COLLECT_VERBS = (
+    r"\b(?:collect(?:s|ed|ing)?|gather(?:s|ed|ing)?|log(?:s|ged|ging)?|record(?:s|ed|ing)?|stor(?:e|es|ed|ing)"
+    r"|obtain(?:s|ed|ing)?|receiv(?:e|es|ed|ing)|process(?:es|ed|ing)?)\b"
+)
+
+# flag -> patterns that name the practice; `decides` limits the answers a rule may
+# give on its own; `deny_requires` is the verb a negation must govern to deny it;
+# `negation: False` for phrases that are negative by nature ("waive class actions").
+RULES = {
+    "uses_cookies": {
+        "patterns": [r"\bcookies?\b(?!-cutter)", r"\bweb beacons?\b", r"\b(?:tracking|web) pixels?\b", r"\bpixel tags?\b"],
+        "decides": ("true", "false"),
+        "deny_requires": r"\b(?:use[sd]?|using|place[sd]?|placing|sets?|setting|employ(?:s|ed|ing)?|deploy(?:s|ed|ing)?)\b",
+    },
+    "collects_ip_address": {
+        "patterns": [r"\bIP[- ]address(?:es)?\b", r"\binternet protocol (?:\(IP\) )?address(?:es)?\b"],
+        "decides": ("true", "false"),
+        "deny_requires": COLLECT_VERBS,
+    },
+    "collects_email_address": {
+        "patterns": [r"\be-?mail address(?:es)?\b"],
+        "decides": ("true", "false"),
+        "deny_requires": COLLECT_VERBS,
+    },
+    "binding_arbitration": {
+        "patterns": [
+            r"\b(?:final and )?binding (?:individual )?arbitration\b",
+            r"\barbitration\b[^.;]{0,80}\b(?:final and )?binding\b",
+            r"\b(?:resolved|settled|decided) (?:exclusively |solely |only )?(?:by|through|in) (?:individual )?arbitration\b",
+        ],
+        "decides": ("true", "false"),
+        "deny_requires": r"\b(?:requires?|use[sd]?|apply|applies|subject|agree[sd]?|mandatory|ha(?:ve|s)|include[sd]?|resolved?|bound)\b",
+        "conflict": "llm",
+    },
+    "class_action_waiver": {
+        "patterns": [
+            r"\bclass[- ]action waiver\b",
+            r"\bwaive\w*\b[^.;]{0,80}\bclass[- ]action",
+            r"\bclass[- ]action\b[^.;]{0,80}\bwaive",
+            r"\b(?:only|solely) (?:on|in) an individual basis\b",
+        ],
+        "decides": ("true",),
+        "negation": False,
+    },
+    "sells_user_data": {
+        "patterns": [
+            r"\bsell\w*\b(?:\W+\w+){0,3}?\W+(?:personal (?:information|data)|your (?:personal )?(?:information|data)|user data)\b",
+            r"\bsold\b(?:\W+\w+){0,3}?\W+(?:personal (?:information|data)|your (?:personal )?(?:information|data)|user data)\b",
+        ],
+        "decides": ("false",),  # "we may sell ..." is often conditional: Gemini decides true
+        "deny_requires": r"\b(?:sell(?:s|ing)?|sold)\b",
+    },
+    "collects_children_data": {
+        "patterns": [
+            r"\bcollect\w*\b[^.;]{0,80}\b(?:children|child|minors?|kids)\b",
+            r"\b(?:children|child|minors?|kids)\b[^.;]{0,80}\bcollect",
+        ],
+        "decides": ("false",),  # "we do not knowingly collect ... from children under 13"
+        "deny_requires": COLLECT_VERBS,
+    },
+}
+
+COMPILED_RULES = {
+    flag_id: {
+        **rule,
+        "patterns": [re.compile(p, re.IGNORECASE) for p in rule["patterns"]],
+        "deny_requires": re.compile(NEGATION_CUES + GOVERNED_GAP + rule["deny_requires"], re.IGNORECASE)
+        if rule.get("deny_requires") else None,
+    }
+    for flag_id, rule in RULES.items()
+}
+RULE_FLAGS = list(RULES)
+
+
+def rules_signature():
+    """Part of the extraction fingerprint: rule edits change results, so they change cache keys."""
+    if not RULES_ENABLED:
+        return None
+    return {"rules": RULES, "negation": [NEGATION_CUES, GOVERNED_GAP, CLAUSE_NEGATION_RE.pattern],
+            "restricted": RESTRICTED_RE.pattern, "clause_breaks": CLAUSE_BREAK_RE.pattern, "hedges": HEDGE_RE.pattern}
+
+
+def _clause_window(text: str, before: bool) -> str:
+    """The words next to a match, up to NEGATION_WINDOW_WORDS and never past a clause break."""
+    breaks = list(CLAUSE_BREAK_RE.finditer(text))
+    if breaks:
+        text = text[breaks[-1].end():] if before else text[:breaks[0].start()]
+    words = WORD_RE.findall(text)
+    words = words[-NEGATION_WINDOW_WORDS:] if before else words[:NEGATION_WINDOW_WORDS]
+    return " ".join(words)
+
+
+def is_negated(sentence: str, start: int, end: int) -> bool:
+    return bool(
+        NEGATION_RE.search(_clause_window(sentence[:start], before=True))
+        or NEGATION_RE.search(sentence[start:end])
+        or NEGATION_RE.search(_clause_window(sentence[end:], before=False))
+        or CLAUSE_NEGATION_RE.match(_clause(sentence, start, end))
+    )
+
+
+def _clause(sentence: str, start: int, end: int) -> str:
+    """The clause around sentence[start:end], between the nearest clause breaks."""
+    lo, hi = 0, len(sentence)
+    for brk in CLAUSE_BREAK_RE.finditer(sentence):
+        if brk.end() <= start:
+            lo = brk.end()
+        elif brk.start() >= end:
+            hi = brk.start()
+            break
+    return sentence[lo:hi]
+
+
+def is_denial(sentence: str, start: int, end: int, governed) -> bool:
+    """The negation governs the practice's verb in the match's clause, and the object isn't narrowed."""
+    if governed is None or RESTRICTED_RE.match(sentence, end):
+        return False
+    return bool(governed.search(_clause(sentence, start, end)))
+
+
+def is_fragment(sentence: str) -> bool:
+    stripped = sentence.rstrip()
+    return not stripped.endswith((".", "!", "?")) and len(WORD_RE.findall(stripped)) < MIN_FRAGMENT_WORDS
+
+
+def _quote(text: str, start: int, end: int, match_start: int, match_end: int):
+    """(start, end) of the sentence, narrowed around the match if it is too long to quote."""
+    start += len(text[start:end]) - len(text[start:end].lstrip())
+    end -= len(text[start:end]) - len(text[start:end].rstrip())
+    if end - start <= MAX_RULE_QUOTE_CHARS:
+        return start, end
+    half = (MAX_RULE_QUOTE_CHARS - (match_end - match_start)) // 2
+    lo = max(start, match_start - max(half, 0))
+    hi = min(end, lo + MAX_RULE_QUOTE_CHARS)
+    while lo > start and lo < match_start and not text[lo - 1].isspace():  # keep whole words
+        lo += 1
+    while hi < end and hi > match_end and not text[hi].isspace():
+        hi -= 1
+    return lo, hi
+
+
+def _trigger_positions(text: str) -> list:
+    lowered = text.lower()
+    if len(lowered) != len(text):  # lowercasing moved offsets (rare scripts): check every sentence
+        return [m.start() for m in SENTENCE_RE.finditer(text)]
+    positions = []
+    for word in TRIGGERS:
+        at = lowered.find(word)
+        while at != -1:
+            positions.append(at)
+            at = lowered.find(word, at + 1)
+    positions.sort()
+    return positions
+
+
+def _candidate_sentences(text: str):
+    """SENTENCE_RE matches for the sentences that contain a trigger word, in order."""
+    sentence_end = -1
+    for position in _trigger_positions(text):
+        if position < sentence_end:
+            continue  # same sentence as the previous trigger
+        start = max(text.rfind(c, 0, position) for c in SENTENCE_ENDS) + 1
+        sentence = SENTENCE_RE.match(text, start)
+        if sentence is None:
+            continue  # a trigger position on a sentence delimiter (fallback path)
+        sentence_end = sentence.end()
+        yield sentence
+
+
+class RuleDecision:
+    __slots__ = ("flag", "present", "quote", "start", "end")
+
+    def __init__(self, flag: str, present: bool, quote: str, start: int, end: int):
+        self.flag = flag
+        self.present = present
+        self.quote = quote
+        self.start = start
+        self.end = end
+
+    def to_flag_result(self) -> dict:
+        """Same shape as one entry of Gemini's flag map."""
+        return {"present": self.present, "evidence": self.quote}
+
+
+def classify(text: str, flag_keys: list = None) -> dict:
+    """flag -> RuleDecision for the flags the rules can decide in `text`; others are absent."""
+    if not RULES_ENABLED:
+        return {}
+    keys = RULE_FLAGS if flag_keys is None else flag_keys
+    rules = {k: COMPILED_RULES[k] for k in keys if k in COMPILED_RULES}
+    if not rules:
+        return {}
+    affirmed, denied, mixed = {}, {}, set()
+    for sentence_match in _candidate_sentences(text):
+        sentence = sentence_match.group()
+        if is_fragment(sentence):
+            continue  # "Cookies and Tracking" names a topic, it doesn't state a practice
+        offset = sentence_match.start()
+        hedged = None
+        for flag_id, rule in rules.items():
+            # Every match in the sentence counts: "partners do not use cookies; we use cookies" is mixed.
+            negated = affirms = denial = None
+            for pattern in rule["patterns"]:
+                for m in pattern.finditer(sentence):
+                    if hedged is None:
+                        hedged = bool(HEDGE_RE.search(sentence))
+                    if hedged:
+                        break  # conditional statements neither affirm nor deny
+                    where = (offset, sentence_match.end(), offset + m.start(), offset + m.end())
+                    if rule.get("negation", True) and is_negated(sentence, m.start(), m.end()):
+                        negated = True
+                        if denial is None and is_denial(sentence, m.start(), m.end(), rule["deny_requires"]):
+                            denial = where
+                    elif affirms is None:
+                        affirms = where
+                if hedged:
+                    break
+            if negated and affirms:
+                mixed.add(flag_id)  # one sentence both ways: Gemini reads it
+            elif affirms:
+                affirmed.setdefault(flag_id, affirms)
+            elif denial:
+                denied.setdefault(flag_id, denial)
+
+    decisions = {}
+    for flag_id, rule in rules.items():
+        if flag_id in affirmed and flag_id in denied and rule.get("conflict") == "llm":
+            continue
+        if flag_id in affirmed:
+            if "true" not in rule["decides"]:
+                continue  # the rule can't rule it out, and can't confirm it either
+            present, where = True, affirmed[flag_id]
+        elif flag_id in denied and flag_id not in mixed and "false" in rule["decides"]:
+            present, where = False, denied[flag_id]
+        else:
+            continue
+        start, end = _quote(text, *where)
+        decisions[flag_id] = RuleDecision(flag_id, present, text[start:end], start, end)
+    return decisions
+
+
+def rules_report(decisions: dict, sent_to_llm: int = None) -> dict:
+    report = {"decided": {flag_id: "true" if d.present else "false" for flag_id, d in decisions.items()}}
+    if sent_to_llm is not None:
+        report["sent_to_llm"] = sent_to_llm
+    return report
@@ -0,0 +1,216 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import contextvars
+from collections import deque
+
+# --- LLM CALL SCHEDULER ---
+# Every Gemini call goes through one scheduler per worker:
+#   * token buckets for requests/minute and tokens/minute,
+#   * priority classes, so interactive requests jump ahead of batch/background work,
+#   * jittered exponential backoff when the API says we are over quota,
+#   * an adaptive concurrency cap (halved on 429s, grown back slowly on success).
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+# Set by endpoints/workers; inherited by the tasks they start.
+current_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+LLM_RPM = float(os.getenv("EVIDENTIA_LLM_RPM", "1000"))
+LLM_TPM = float(os.getenv("EVIDENTIA_LLM_TPM", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("EVIDENTIA_LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("EVIDENTIA_LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("EVIDENTIA_LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("EVIDENTIA_LLM_BACKOFF_MAX", "30"))
+
+
+class RateLimitedError(Exception):
+    """The LLM kept answering 'over quota' after every retry."""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def is_transient_error(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in (500, 503) or "UNAVAILABLE" in str(error)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """Correct an estimate once the real cost is known (may go negative)."""
+        self._refill()
+        self.level -= delta
+
+
+class LLMScheduler:
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.active = 0
+        self._waiting = []  # heap of [priority, seq, future, tokens, enqueued_at]
+        self._seq = itertools.count()
+        self._timer = None
+        self._success_streak = 0
+        self._last_decrease = 0.0
+
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self._waits = {p: deque(maxlen=500) for p in PRIORITY_NAMES}
+
+    async def run(self, fn, tokens: int = 0, priority: int = None):
+        """Call `fn()` (a coroutine factory) once a slot and budget are free, retrying on 429s."""
+        priority = current_priority.get() if priority is None else priority
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                limited = is_rate_limit_error(e)
+                if limited:
+                    self.rate_limited += 1
+                    self._decrease()
+                if not (limited or is_transient_error(e)) or attempt == self.max_retries:
+                    self.failed += 1
+                    if limited:
+                        raise RateLimitedError(str(e)) from e
+                    raise
+            else:
+                self.completed += 1
+                self._increase()
+                self._record_usage(result, tokens)
+                return result
+            finally:
+                self._release()
+
+            self.retries += 1
+            ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            await asyncio.sleep(random.uniform(ceiling / 2, ceiling))  # jittered
+
+    # --- slots & budget ---
+    async def _acquire(self, priority: int, tokens: int):
+        loop = asyncio.get_running_loop()
+        entry = [priority, next(self._seq), loop.create_future(), tokens, time.monotonic()]
+        heapq.heappush(self._waiting, entry)
+        self._dispatch()
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                self._release()  # got a slot just as we were cancelled
+            else:
+                entry[2].cancel()
+            raise
+        self._waits[priority].append(time.monotonic() - entry[4])
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiting and self.active < self.concurrency:
+            _, _, future, tokens, _ = self._waiting[0]
+            if future.cancelled():
+                heapq.heappop(self._waiting)
+                continue
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.active += 1
+            future.set_result(None)
+
+    def _record_usage(self, response, estimated: int):
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None) if usage is not None else None
+        if actual:
+            self.tokens.adjust(actual - estimated)
+
+    # --- adaptive concurrency (AIMD) ---
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease > 1.0:  # one cut per burst of 429s
+            self.concurrency = max(1, self.concurrency // 2)
+            self._last_decrease = now
+        self._success_streak = 0
+
+    def _increase(self):
+        self._success_streak += 1
+        if self._success_streak >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self._success_streak = 0
+            self._dispatch()
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future, _, _ in self._waiting:
+            if not future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[PRIORITY_NAMES[priority]] = {
+                "samples": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else 0.0,
+                "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+            }
+        return {
+            "queue_depth": sum(queued.values()),
+            "queued": queued,
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "wait": waits,
+            "budget": {
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level),
+            },
+        }
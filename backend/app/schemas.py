@@ -1,6 +1,11 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 
+class EvidenceSpan(BaseModel):
+    start: int  # character offsets into the analyzed (cleaned) text, see AnalyzeResponse.analyzed_text
+    end: int
+    match: str  # exact, normalized, fragments
+
 class Finding(BaseModel):
     flag: str
     label: str
@@ -8,6 +13,7 @@ class Finding(BaseModel):
     status: str  # true, false, unknown
     confidence: float
     evidence_quote: Optional[str] = None
+    evidence_span: Optional[EvidenceSpan] = None  # None when the quote could not be found
     url: Optional[str] = None
 
 class AnalyzeResponse(BaseModel):
@@ -15,6 +21,7 @@ class AnalyzeResponse(BaseModel):
     category_scores: Dict[str, float]
     findings: List[Finding]
     meta: Optional[Dict[str, Any]] = None  # Add meta field to store additional info like URL
+    analyzed_text: Optional[str] = None  # only when requested (include_text)
 
 
 class CompareResponse(BaseModel):
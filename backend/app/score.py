@@ -1,24 +1,81 @@
+import numpy as np
+
 # --- FIX: Direct imports ---
-from weights import FLAG_WEIGHTS
-from flags import FLAGS
+from weights import FLAG_WEIGHTS, MAX_RISK_BASELINE
+from flags import FLAGS, FLAG_IDS, FLAG_INDEX, FLAG_CATEGORY
+
+# --- VECTORIZED SCORING ---
+# Findings are held as a document x flag matrix of status codes and confidences
+# (columns in FLAGS order). Scoring any number of documents is then a couple of
+# array operations, so a weight change can re-score the whole cache in one pass.
+
+UNSET, TRUE, FALSE, UNKNOWN = 0, 1, 2, 3
+STATUS_CODES = {"true": TRUE, "false": FALSE, "unknown": UNKNOWN}
+CATEGORIES = list(FLAGS.keys())
+
+WEIGHTS = np.array([FLAG_WEIGHTS.get(flag_id, 0) for flag_id in FLAG_IDS], dtype=np.float64)
+# flag -> category one-hot, so impact @ CATEGORY_MATRIX sums each category
+CATEGORY_MATRIX = np.zeros((len(FLAG_IDS), len(CATEGORIES)))
+for _flag_id, _i in FLAG_INDEX.items():
+    CATEGORY_MATRIX[_i, CATEGORIES.index(FLAG_CATEGORY[_flag_id])] = 1.0
+
+
+class FindingsMatrix:
+    """Status codes (int8) and confidences (float64), one row per document."""
+
+    def __init__(self, status: np.ndarray, confidence: np.ndarray):
+        self.status = status
+        self.confidence = confidence
+
+    @classmethod
+    def from_findings(cls, documents: list) -> "FindingsMatrix":
+        """`documents` is a list of findings lists. Unknown flag ids are ignored."""
+        rows, cols, codes, confidences = [], [], [], []
+        for row, findings in enumerate(documents):
+            for finding in findings:
+                col = FLAG_INDEX.get(finding.get("flag"))
+                code = STATUS_CODES.get(finding.get("status"))
+                if col is None or code is None:
+                    continue
+                rows.append(row)
+                cols.append(col)
+                codes.append(code)
+                confidences.append(finding.get("confidence", 1.0))
+        status = np.zeros((len(documents), len(FLAG_IDS)), dtype=np.int8)
+        confidence = np.zeros((len(documents), len(FLAG_IDS)), dtype=np.float64)
+        status[rows, cols] = codes
+        confidence[rows, cols] = confidences
+        return cls(status, confidence)
+
+    def __len__(self):
+        return self.status.shape[0]
+
+
+def risk_scores(matrix: FindingsMatrix, weights: np.ndarray = WEIGHTS, baseline: float = MAX_RISK_BASELINE):
+    """(overall score per document, category scores per document) for the risk report."""
+    impact = np.where(matrix.status == TRUE, matrix.confidence, 0.0) * weights
+    overall = np.minimum(impact.sum(axis=1) / baseline * 100, 100)
+    return overall, impact @ CATEGORY_MATRIX
+
+
+def score_dicts(overall: np.ndarray, categories: np.ndarray) -> list:
+    """Report-shaped {"overall_score", "category_scores"} per document."""
+    return [
+        {"overall_score": round(score, 2), "category_scores": dict(zip(CATEGORIES, row))}
+        for score, row in zip(overall.tolist(), categories.tolist())
+    ]
+
+
+def score_findings(findings: list) -> dict:
+    return score_dicts(*risk_scores(FindingsMatrix.from_findings([findings])))[0]
+
 
 def compute_score(findings):
-    overall_score = 0
-    category_scores = { category: 0 for category in FLAGS.keys() }
-
-    for finding in findings:
-        flag = finding['flag']
-        status = finding['status']
-        confidence = finding['confidence']
-        weight = FLAG_WEIGHTS.get(flag, 0)
-
-        # Calculate score based on flag status and confidence
-        if status == "true":
-            overall_score += weight * confidence
-            category_scores[finding['category']] += weight * confidence
-        elif status == "false":
-            overall_score -= weight  
-        elif status == "unknown":
-            overall_score -= weight * 0.5  
-
-    return overall_score, category_scores
\ No newline at end of file
+    """Legacy net score: true adds weight x confidence, false/unknown subtract."""
+    matrix = FindingsMatrix.from_findings([findings])
+    status = matrix.status
+    true_impact = np.where(status == TRUE, matrix.confidence, 0.0) * WEIGHTS
+    penalty = (np.where(status == FALSE, 1.0, 0.0) + np.where(status == UNKNOWN, 0.5, 0.0)) * WEIGHTS
+    overall_score = float((true_impact - penalty).sum())
+    category_scores = dict(zip(CATEGORIES, (true_impact @ CATEGORY_MATRIX)[0].tolist()))
+    return overall_score, category_scores
@@ -0,0 +1,38 @@
+import asyncio
+
+# --- SINGLE-FLIGHT COALESCING ---
+# When many requests ask for the same thing at once, only the first one does the
+# work. Everyone else awaits the same task instead of paying for a duplicate call.
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.executions = 0  # calls that actually ran
+        self.coalesced = 0   # calls that piggy-backed on one already in flight
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        """Run `fn()` for `key`, or join the run already in progress for it."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            self.coalesced += 1
+        # shield: a caller that disconnects must not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,64 @@
+import re
+import json
+import asyncio
+from types import SimpleNamespace
+
+from guardrails import GUARDRAILS, TOPIC_VOCABULARY
+
+# --- STUB GEMINI CLIENT ---
+# Stands in for genai.Client when EVIDENTIA_STUB_LLM=1, so the app (and the
+# streaming UI) can be run and demoed without an API key or network access.
+# A flag is "present" when one of its guardrail keywords appears in a sentence,
+# and that sentence is returned as the evidence quote.
+
+SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]?")
+POLICY_MARKER_RE = re.compile(r"----- POLICY ([AB]) START -----\n(.*?)\n\s*----- POLICY \1 END -----", re.S)
+
+
+def _policy_texts(prompt: str) -> dict:
+    """Pull the policy text(s) out of a prompt built by llm.py."""
+    sides = POLICY_MARKER_RE.findall(prompt)
+    if sides:
+        return {f"policy_{side}": text for side, text in sides}
+    return {None: prompt.rsplit("Text:", 1)[-1]}
+
+
+def _answer(text: str, flag_keys: list) -> dict:
+    sentences = [s.strip() for s in SENTENCE_RE.findall(text) if len(s.split()) >= 3]
+    answer = {}
+    for flag_id in flag_keys:
+        keywords = GUARDRAILS.get(flag_id, []) + TOPIC_VOCABULARY.get(flag_id, [])
+        patterns = [re.compile(p, re.IGNORECASE) for p in keywords]
+        quote = next((s for s in sentences if any(p.search(s) for p in patterns)), "")
+        answer[flag_id] = {"present": bool(quote), "evidence": quote}
+    return answer
+
+
+def _respond(contents: str, schema: dict) -> dict:
+    texts = _policy_texts(contents)
+    if None in texts:
+        return _answer(texts[None], list(schema["properties"]))
+    return {
+        side: _answer(text, list(schema["properties"][side]["properties"]))
+        for side, text in texts.items()
+    }
+
+
+class _StubModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def generate_content(self, model, contents, config):
+        if self.owner.latency:
+            await asyncio.sleep(self.owner.latency)
+        # Keyword matching runs in a worker thread: Gemini's answer is a network
+        # wait, so the stub must not hold the event loop either.
+        text = json.dumps(await asyncio.to_thread(_respond, contents, config.response_schema))
+        usage = SimpleNamespace(prompt_token_count=len(contents) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class StubClient:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.aio = SimpleNamespace(models=_StubModels(self))
@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# --- STUB YELLOWCAKE SERVER ---
+# A stand-in for the Yellowcake extract API, for developing and testing the
+# fetch layer without scraping real sites:
+#
+#   uvicorn stub_yellowcake:app --port 8001
+#   YELLOWCAKE_URL=http://localhost:8001/v1/extract YELLOWCAKE_API_KEY=stub uvicorn main:app
+#
+# Any URL containing "blocked" answers like a protected site (the page was reached
+# but only served a block page); a missing API key gets a 401; everything else
+# gets a generated policy. /stats shows how many scrapes actually reached it.
+
+STUB_LATENCY = float(os.getenv("EVIDENTIA_STUB_YELLOWCAKE_LATENCY", "0.5"))
+
+POLICY_TEMPLATE = """Privacy Policy for {url}
+
+We use cookies and similar technologies to remember your preferences and measure traffic.
+We collect your email address and IP address when you create an account.
+We may share your personal information with advertising partners and analytics providers.
+We retain your data for as long as your account is active and as required by law.
+You may request deletion of your account by contacting our support team.
+Any dispute will be resolved by binding arbitration and you waive the right to a class action.
+We may update these terms at any time without notice.
+"""
+
+app = FastAPI(title="Stub Yellowcake")
+calls = {}
+
+
+@app.post("/v1/extract")
+async def extract(request: Request):
+    if not request.headers.get("x-api-key"):
+        return JSONResponse(status_code=401, content={"error": "Invalid API key"})
+    body = await request.json()
+    url = body.get("url", "")
+    calls[url] = calls.get(url, 0) + 1
+    if STUB_LATENCY:
+        await asyncio.sleep(STUB_LATENCY)
+    if "blocked" in url:
+        return {"text": "Access denied"}
+    return {"text": POLICY_TEMPLATE.format(url=url)}
+
+
+@app.get("/stats")
+def stats():
+    return {"total": sum(calls.values()), "calls": calls}
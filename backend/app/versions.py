@@ -0,0 +1,264 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+from cache import CACHE_PATH, open_sqlite
+from context import split_paragraphs
+from guardrails import GUARDRAILS, GUARDRAIL_ENGINE, TOPIC_VOCABULARY, scan_guardrails
+from llm import (
+    analyze_flags, call_llm_extract, calculate_scores, diff_findings, is_provisional, normalize,
+    normalize_for_match, resolve_evidence, with_analyzed_text,
+)
+from locator import EvidenceLocator, evidence_report
+from neardup import policy_digest
+
+# --- POLICY VERSION TRACKING ---
+# Each document id (URL or caller-supplied id) keeps a history of versions with
+# per-paragraph content hashes. A new version only sends its changed/added
+# paragraphs to the LLM; findings backed by unchanged paragraphs carry forward.
+# A carried flag that the changed text talks about but doesn't support is judged
+# again, so a new "we no longer ..." can retract it. Flags about something missing
+# from the whole document can't be judged on a delta (a few paragraphs lack almost
+# everything): they are judged again, on the document's best-ranked paragraphs,
+# only when an added, changed or removed paragraph touches their topic.
+DOCUMENT_FLAG_TOPICS = {
+    "no_data_deletion": [r"delet", r"eras", r"remov", r"destroy", r"forgotten"],
+    "no_data_portability": [r"portab", r"export", r"download", r"copy of", r"machine[- ]readable", r"transfer"],
+    "no_access_correction_rights": [r"access", r"correct", r"rectif", r"updat", r"amend", r"inaccura"],
+    "indefinite_data_retention": TOPIC_VOCABULARY["indefinite_data_retention"],
+}
+DOCUMENT_FLAGS = list(DOCUMENT_FLAG_TOPICS)
+DOCUMENT_TOPIC_RES = {flag_id: re.compile("|".join(p)) for flag_id, p in DOCUMENT_FLAG_TOPICS.items()}  # lowercase
+
+
+def paragraph_hash(paragraph: str) -> str:
+    return hashlib.md5(normalize_for_match(paragraph).encode("utf-8")).hexdigest()
+
+
+class VersionStore:
+    """
+    Version history in the shared SQLite file. `paragraphs` holds the paragraph
+    hashes of a version and, per finding, the hash of the paragraph its quote came from.
+    """
+
+    def __init__(self, path: str = CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path or ":memory:")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS policy_versions ("
+            "doc_id TEXT NOT NULL, version INTEGER NOT NULL, created REAL NOT NULL, "
+            "text_hash TEXT NOT NULL, paragraphs TEXT NOT NULL, report TEXT NOT NULL, "
+            "PRIMARY KEY (doc_id, version))"
+        )
+
+    def latest(self, doc_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, text_hash, paragraphs, report FROM policy_versions "
+                "WHERE doc_id = ? ORDER BY version DESC LIMIT 1",
+                (doc_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        version, text_hash, paragraphs, report = row
+        return {
+            "version": version,
+            "text_hash": text_hash,
+            "paragraphs": json.loads(paragraphs),
+            "report": json.loads(report),
+        }
+
+    def save(self, doc_id: str, text_hash: str, paragraphs: dict, report: dict) -> int:
+        # One statement under a write lock: workers in other processes can't take the same number.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (version,) = self._conn.execute(
+                    "INSERT INTO policy_versions (doc_id, version, created, text_hash, paragraphs, report) "
+                    "SELECT ?, COALESCE(MAX(version), 0) + 1, ?, ?, ?, ? FROM policy_versions WHERE doc_id = ? "
+                    "RETURNING version",
+                    (doc_id, time.time(), text_hash, json.dumps(paragraphs), json.dumps(report), doc_id),
+                ).fetchone()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return version
+
+    def history(self, doc_id: str) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, created, text_hash FROM policy_versions WHERE doc_id = ? ORDER BY version",
+                (doc_id,),
+            ).fetchall()
+        return [{"version": v, "created": c, "text_hash": h} for v, c, h in rows]
+
+
+VERSION_STORE = VersionStore()
+
+
+def document_topics(paragraph: str) -> list:
+    """DOCUMENT_FLAGS whose topic comes up in `paragraph`."""
+    lowered = paragraph.lower()
+    return [flag_id for flag_id, pattern in DOCUMENT_TOPIC_RES.items() if pattern.search(lowered)]
+
+
+def touched_document_flags(changed: list, removed: set, previous_paragraphs: dict) -> set:
+    """DOCUMENT_FLAGS whose topic an added/changed paragraph or a removed one touches."""
+    touched = {flag_id for paragraph in changed for flag_id in document_topics(paragraph)}
+    topics = previous_paragraphs.get("topics")
+    if topics is None:  # stored before topics were recorded: any removal may matter
+        return set(DOCUMENT_FLAGS) if removed else touched
+    return touched | {flag_id for h in removed for flag_id in topics.get(h, [])}
+
+
+def discussed_flags(text: str) -> set:
+    """Flags with keywords (guardrails or topic vocabulary) that come up in `text`."""
+    scan = scan_guardrails(text)
+    return {flag_id for flag_id in (*GUARDRAILS, *TOPIC_VOCABULARY) if GUARDRAIL_ENGINE.may_be_present(flag_id, scan)}
+
+
+def attribute_findings(findings: list, paragraphs: list, hashes: list) -> dict:
+    """flag -> hash of the paragraph holding its quote (None if it spans paragraphs)."""
+    normalized = [normalize_for_match(p) for p in paragraphs]
+    sources = {}
+    for finding in findings:
+        quote = normalize_for_match(finding.get("evidence_quote") or "")
+        sources[finding["flag"]] = next(
+            (h for p, h in zip(normalized, hashes) if quote and quote in p), None
+        )
+    return sources
+
+
+async def analyze_versioned(doc_id: str, policy_text: str, mode: str = None, with_text: bool = False) -> dict:
+    """Analyze `policy_text` as the next version of `doc_id`; `with_text` as in call_llm_extract."""
+    # Cleaning, paragraph hashing, evidence location and the SQLite reads/writes
+    # run in worker threads; only the LLM calls are awaited on the event loop.
+    normalized = await asyncio.to_thread(normalize, policy_text)
+    report = await _analyze_versioned(doc_id, policy_text, normalized, mode)
+    return await asyncio.to_thread(with_analyzed_text, report, normalized.text) if with_text else report
+
+
+def _load(doc_id: str, clean_text: str):
+    paragraphs = split_paragraphs(clean_text)
+    return paragraphs, [paragraph_hash(p) for p in paragraphs], VERSION_STORE.latest(doc_id)
+
+
+async def _analyze_versioned(doc_id: str, policy_text: str, normalized, mode: str = None) -> dict:
+    clean_text = normalized.text
+    text_hash = hashlib.md5(normalized.key_text.encode("utf-8")).hexdigest()
+    paragraphs, hashes, previous = await asyncio.to_thread(_load, doc_id, clean_text)
+    if previous is not None and previous["text_hash"] == text_hash:
+        report = previous["report"]
+        report.update(calculate_scores(report.get("findings", [])))  # weights may have changed since
+        report.setdefault("meta", {})["versioning"] = {
+            "document_id": doc_id,
+            "version": previous["version"],
+            "previous_version": previous["version"],
+            "unchanged": True,
+        }
+        return report
+
+    if previous is None:
+        report = await call_llm_extract(policy_text, mode)
+        if "error" in report or is_provisional(report):
+            return report  # provisional reports are not stored as versions
+        findings = report["findings"]
+        paragraph_changes = {"added": len(paragraphs), "removed": 0, "unchanged": 0}
+        previous_findings = []
+    else:
+        old_hashes = set(previous["paragraphs"]["hashes"])
+        new_hashes = set(hashes)
+        changed = [p for p, h in zip(paragraphs, hashes) if h not in old_hashes]
+        touched = await asyncio.to_thread(touched_document_flags, changed, old_hashes - new_hashes, previous["paragraphs"])
+        paragraph_changes = {
+            "added": len(changed),
+            "removed": len(old_hashes - new_hashes),
+            "unchanged": sum(1 for h in hashes if h in old_hashes),
+        }
+
+        # Carry forward findings whose source paragraph survived untouched, and
+        # document-level findings whose topic no change touched.
+        locator = EvidenceLocator(clean_text)
+        previous_findings = previous["report"].get("findings", [])
+        sources = previous["paragraphs"]["sources"]
+
+        def carry_forward():
+            carried = {}
+            for finding in previous_findings:
+                source = sources.get(finding["flag"])
+                if finding["flag"] in DOCUMENT_FLAGS:
+                    if finding["flag"] not in touched:
+                        carried[finding["flag"]] = finding
+                elif (source in new_hashes) or (source is None and locator.locate(finding.get("evidence_quote"))):
+                    carried[finding["flag"]] = finding
+            return carried
+
+        carried = await asyncio.to_thread(carry_forward)
+
+        fresh = {}
+        rejudge = [flag_id for flag_id in DOCUMENT_FLAGS if flag_id in touched]
+        if changed:
+            print(f"🔁 Incremental re-analysis: {len(changed)} of {len(paragraphs)} paragraphs changed", flush=True)
+            delta_text = "\n".join(changed)
+            delta = await call_llm_extract(delta_text, mode)
+            if "error" in delta or is_provisional(delta):
+                return delta
+            fresh = {f["flag"]: f for f in delta["findings"] if f["flag"] not in DOCUMENT_FLAGS}
+            rejudge += [
+                flag_id for flag_id in await asyncio.to_thread(discussed_flags, delta_text)
+                if flag_id in carried and flag_id not in fresh and flag_id not in DOCUMENT_FLAGS
+            ]
+
+        # Added and removed paragraphs both change what the document lacks.
+        if rejudge:
+            print(f"🔁 Re-judging {len(rejudge)} flags on the whole document", flush=True)
+            digest = await asyncio.to_thread(policy_digest, clean_text)
+            document = await analyze_flags(clean_text, rejudge, mode, digest)
+            if "error" in document or is_provisional(document):
+                return document
+            for flag_id in rejudge:
+                carried.pop(flag_id, None)
+            fresh.update({f["flag"]: f for f in document["findings"]})
+
+        # Spans from the previous version / the delta text are re-resolved in the new text.
+        def resolve():
+            findings = [resolve_evidence(dict(f), locator) for f in {**carried, **fresh}.values()]
+            return findings, {"findings": findings, **calculate_scores(findings),
+                              "meta": {"evidence": evidence_report(findings, clean_text)}}
+
+        findings, report = await asyncio.to_thread(resolve)
+
+    added, removed = _flag_changes(previous_findings, findings)
+    report = dict(report)
+    report["meta"] = dict(report.get("meta") or {})
+
+    def store():
+        stored_paragraphs = {
+            "hashes": hashes,
+            "sources": attribute_findings(findings, paragraphs, hashes),
+            "topics": {h: topics for p, h in zip(paragraphs, hashes) if (topics := document_topics(p))},
+        }
+        return VERSION_STORE.save(doc_id, text_hash, stored_paragraphs, report)
+
+    version = await asyncio.to_thread(store)
+    report["meta"]["versioning"] = {
+        "document_id": doc_id,
+        "version": version,
+        "previous_version": previous["version"] if previous else None,
+        "unchanged": False,
+        "changes": {
+            "paragraphs": paragraph_changes,
+            "flags_added": added,
+            "flags_removed": removed,
+        },
+    }
+    return report
+
+
+def _flag_changes(old_findings: list, new_findings: list):
+    _, removed, added = diff_findings(old_findings, new_findings)
+    return [f["flag"] for f in added], [f["flag"] for f in removed]
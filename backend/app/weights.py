@@ -44,4 +44,7 @@ FLAG_WEIGHTS = {
     "reidentifies_anonymous_data": 10,
     "forced_disclosure_of_data": 10,
     "life_control_technology": 10
-}
\ No newline at end of file
+}
+
+# Sum of weighted risks that maps to a score of 100.
+MAX_RISK_BASELINE = 75
@@ -0,0 +1,112 @@
+"""
+Rule classifier vs labels (and vs Gemini) on a labeled fixture set.
+
+    python backend/bench/agreement.py                       # rules vs labels
+    python backend/bench/agreement.py --llm                 # + Gemini (GEMINI_API_KEY)
+    EVIDENTIA_STUB_LLM=1 python backend/bench/agreement.py --llm
+
+Each fixture is a policy snippet with gold labels for some flags. Per flag the
+report shows how many labeled cases the rules decided (coverage) and how many of
+those they got right (precision); a rule flag should stay near 100% precision,
+since a wrong decision never reaches Gemini. With --llm, Gemini answers every
+labeled flag and the report adds its accuracy and its agreement with the rules
+on the cases the rules decided.
+"""
+import os
+import json
+import asyncio
+import argparse
+from collections import defaultdict
+
+from run import BENCH_DIR, configure_env, say
+
+FIXTURES_PATH = os.path.join(BENCH_DIR, "fixtures", "labeled_policies.json")
+
+
+def load_fixtures(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def score_rules(fixtures: list) -> dict:
+    from rules import classify
+
+    per_flag = defaultdict(lambda: {"labeled": 0, "decided": 0, "correct": 0})
+    mistakes = []
+    decisions = {}
+    for case in fixtures:
+        decided = classify(case["text"], list(case["labels"]))
+        decisions[case["id"]] = decided
+        for flag_id, label in case["labels"].items():
+            row = per_flag[flag_id]
+            row["labeled"] += 1
+            if flag_id not in decided:
+                continue
+            row["decided"] += 1
+            if decided[flag_id].present == label:
+                row["correct"] += 1
+            else:
+                mistakes.append({"id": case["id"], "flag": flag_id, "label": label, "rules": decided[flag_id].present})
+    return {"per_flag": dict(per_flag), "mistakes": mistakes, "decisions": decisions}
+
+
+async def score_llm(fixtures: list, decisions: dict) -> dict:
+    import llm
+
+    per_flag = defaultdict(lambda: {"labeled": 0, "correct": 0, "rules_decided": 0, "agree": 0})
+    for case in fixtures:
+        flag_map = await llm._extract_flag_map(case["text"], list(case["labels"]))
+        for flag_id, label in case["labels"].items():
+            present = bool((flag_map.get(flag_id) or {}).get("present"))
+            row = per_flag[flag_id]
+            row["labeled"] += 1
+            row["correct"] += present == label
+            decided = decisions[case["id"]].get(flag_id)
+            if decided is not None:
+                row["rules_decided"] += 1
+                row["agree"] += decided.present == present
+    return dict(per_flag)
+
+
+def pct(part: int, whole: int) -> str:
+    return f"{part / whole * 100:5.1f}%" if whole else "    -"
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Measure rule-classifier agreement with labels and with Gemini.")
+    p.add_argument("--fixtures", default=FIXTURES_PATH)
+    p.add_argument("--llm", action="store_true", help="also ask Gemini (or the stub) for every labeled flag")
+    p.add_argument("--out", help="write the report as JSON")
+    args = p.parse_args(argv)
+
+    configure_env()
+    if not args.llm:
+        os.environ["GEMINI_API_KEY"] = ""
+    fixtures = load_fixtures(args.fixtures)
+    rules = score_rules(fixtures)
+
+    say(f"📏 Rules vs labels ({len(fixtures)} fixtures)")
+    say(f"  {'flag':<26} {'labeled':>8} {'coverage':>9} {'precision':>10}")
+    for flag_id, row in sorted(rules["per_flag"].items()):
+        say(f"  {flag_id:<26} {row['labeled']:>8} {pct(row['decided'], row['labeled']):>9} {pct(row['correct'], row['decided']):>10}")
+    for m in rules["mistakes"]:
+        say(f"  ❌ {m['id']}: {m['flag']} labeled {m['label']}, rules said {m['rules']}")
+
+    report = {"fixtures": len(fixtures), "rules": rules["per_flag"], "rule_mistakes": rules["mistakes"]}
+    if args.llm:
+        llm_rows = asyncio.run(score_llm(fixtures, rules["decisions"]))
+        say("\n🤖 Gemini vs labels, and vs rules where the rules decided")
+        say(f"  {'flag':<26} {'labeled':>8} {'accuracy':>9} {'decided':>8} {'agreement':>10}")
+        for flag_id, row in sorted(llm_rows.items()):
+            say(f"  {flag_id:<26} {row['labeled']:>8} {pct(row['correct'], row['labeled']):>9} "
+                f"{row['rules_decided']:>8} {pct(row['agree'], row['rules_decided']):>10}")
+        report["llm"] = llm_rows
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        say(f"\n💾 Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import random
+
+# --- SYNTHETIC POLICY CORPUS ---
+# Deterministic, policy-shaped text: headings, risky clauses that trip the
+# guardrails, boilerplate, navigation/footer noise and plenty of filler.
+# A `variant` reshuffles the document so cold-cache runs never collide.
+
+SIZES = {"small": 2_000, "medium": 20_000, "large": 120_000, "xlarge": 400_000}
+
+HEADINGS = [
+    "Information We Collect", "How We Use Your Information", "Cookies and Tracking",
+    "Sharing Your Information", "Data Retention", "Your Rights and Choices",
+    "Children's Privacy", "Dispute Resolution", "Changes to This Policy", "Contact Us",
+]
+
+RISKY_CLAUSES = [
+    "We use cookies, pixels and web beacons to remember your preferences and measure traffic.",
+    "We collect your IP address, device ID and browser type when you visit the service.",
+    "We collect your email address and date of birth when you create an account.",
+    "We may collect precise location information from your device, including GPS coordinates.",
+    "We share personal information with advertising partners to deliver interest-based ads.",
+    "We may sell your personal information to third parties, including data brokers.",
+    "We retain your information for as long as necessary for our business purposes.",
+    "You agree that any dispute will be resolved by binding arbitration and you waive any class action.",
+    "We may modify these terms at any time without notice.",
+    "We may disclose information to law enforcement or government authorities when required.",
+    "We track your activity across other websites and apps using third-party cookies.",
+    "We may collect health information you choose to provide.",
+]
+
+SAFE_CLAUSES = [
+    "We do not sell your personal information.",
+    "You can access, correct or delete your personal information at any time.",
+    "We use industry-standard encryption to protect data in transit and at rest.",
+    "We only keep account records for 30 days after you close your account.",
+]
+
+FILLER = (
+    "The service provider processes the information described in this section in accordance "
+    "with applicable law and the purposes set out in this policy, and takes reasonable "
+    "organizational and technical measures appropriate to the nature of the processing"
+).split()
+
+NOISE = ["Home", "About Us", "Contact", "Login", "© 2024 Example Corp. All rights reserved.", "Careers | Press | Blog"]
+
+
+def _filler_sentence(rng: random.Random) -> str:
+    words = rng.sample(FILLER, rng.randint(12, 24))
+    return " ".join(words).capitalize() + "."
+
+
+def make_policy(size: int, variant: int = 0, seed: int = 7) -> str:
+    """A policy of roughly `size` characters."""
+    rng = random.Random(seed * 1_000_003 + size * 31 + variant)
+    lines = rng.sample(NOISE, 3) + [f"Privacy Policy (revision {variant})"]
+    length = sum(len(line) + 1 for line in lines)
+    while length < size:
+        section = [rng.choice(HEADINGS)]
+        for _ in range(rng.randint(2, 5)):
+            sentences = [_filler_sentence(rng) for _ in range(rng.randint(2, 6))]
+            if rng.random() < 0.35:
+                sentences.insert(rng.randrange(len(sentences) + 1), rng.choice(RISKY_CLAUSES))
+            if rng.random() < 0.15:
+                sentences.append(rng.choice(SAFE_CLAUSES))
+            section.append(" ".join(sentences))
+        lines.extend(section)
+        length += sum(len(line) + 1 for line in section)
+    lines.extend(rng.sample(NOISE, 2))
+    return "\n".join(lines)[:max(size, 200)]
+
+
+def corpus(sizes: dict = SIZES, variants: int = 1) -> dict:
+    """{size name: [policy text per variant]}"""
+    return {name: [make_policy(size, v) for v in range(variants)] for name, size in sizes.items()}
@@ -0,0 +1,143 @@
+import json
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import httpx
+
+from stub_llm import _policy_texts, _answer
+
+# --- FAKE BACKENDS ---
+# Drop-in replacements for genai.Client and the Yellowcake endpoint, with
+# configurable latency, jitter and failure rates. The Gemini fake answers from
+# recorded responses when it has one for a prompt, and otherwise falls back to
+# the keyword stub (stub_llm.py), so results have realistic shape and size.
+
+
+class FakeAPIError(Exception):
+    """Looks like a google-genai APIError to the scheduler (it reads `.code`)."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+def load_recordings(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def generate_content(self, model, contents, config):
+        owner = self.owner
+        owner.calls += 1
+        await asyncio.sleep(owner.delay(len(contents)))
+        roll = owner.rng.random()
+        if roll < owner.rate_limit_rate:
+            owner.failures += 1
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+        if roll < owner.rate_limit_rate + owner.failure_rate:
+            owner.failures += 1
+            raise FakeAPIError(503, "UNAVAILABLE")
+
+        text = owner.recordings.get(prompt_digest(contents))
+        if text is None:
+            schema = config.response_schema
+            texts = _policy_texts(contents)
+            if None in texts:
+                data = _answer(texts[None], list(schema["properties"]))
+            else:
+                data = {
+                    side: _answer(body, list(schema["properties"][side]["properties"]))
+                    for side, body in texts.items()
+                }
+            text = json.dumps(data)
+        else:
+            owner.replayed += 1
+        usage = SimpleNamespace(
+            prompt_token_count=len(contents) // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(contents) + len(text)) // 4,
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeGenaiClient:
+    """
+    `latency` seconds per call (+ `per_kchar` per 1000 prompt chars, ± `jitter`).
+    `failure_rate` raises 503s and `rate_limit_rate` raises 429s, both retried
+    by the scheduler like real API errors.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, per_kchar: float = 0.0,
+                 failure_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 recordings: dict = None, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_kchar = per_kchar
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.recordings = recordings or {}
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.replayed = 0
+        self.aio = SimpleNamespace(models=_FakeModels(self))
+
+    def delay(self, prompt_chars: int) -> float:
+        base = self.latency + self.per_kchar * prompt_chars / 1000
+        return max(0.0, base + self.rng.uniform(-self.jitter, self.jitter))
+
+
+class RecordingClient:
+    """Wraps a real client and saves every response, for replay by FakeGenaiClient."""
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.path = path
+        self.recordings = {}
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate))
+
+    async def _generate(self, model, contents, config):
+        response = await self.inner.aio.models.generate_content(model=model, contents=contents, config=config)
+        self.recordings[prompt_digest(contents)] = response.text
+        return response
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.recordings, f)
+
+
+class FakeYellowcake:
+    """
+    httpx transport serving the Yellowcake extract API. `pages` maps URL ->
+    policy text; unknown URLs and `failure_rate` draws answer like a blocked site.
+    """
+
+    def __init__(self, pages: dict, latency: float = 1.0, jitter: float = 0.2,
+                 failure_rate: float = 0.0, seed: int = 2):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        url = json.loads(request.content).get("url", "")
+        if url not in self.pages or self.rng.random() < self.failure_rate:
+            return httpx.Response(200, json={"text": "Access denied"})  # the site served a block page
+        return httpx.Response(200, json={"text": self.pages[url]})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self))
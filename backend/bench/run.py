@@ -0,0 +1,278 @@
+"""
+Evidentia benchmark harness.
+
+Drives the FastAPI app in-process (httpx ASGITransport) with fake Gemini and
+Yellowcake backends, over a synthetic corpus from ~2KB to ~400KB:
+
+    python backend/bench/run.py                         # default run
+    python backend/bench/run.py --sizes small,large --concurrency 16 --requests 64
+    python backend/bench/run.py --llm-failure-rate 0.05 --llm-rate-limit-rate 0.1
+    python backend/bench/run.py --baseline backend/bench/results/<earlier>.json
+
+Load scenarios report p50/p95/p99 latency and requests/sec; microbenchmarks
+time clean_noise, passes_guardrails and calculate_scores. Each run is saved as
+JSON (backend/bench/results/ by default) and can be diffed with --baseline.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import timeit
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "app")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the Evidentia API with fake backends.")
+    p.add_argument("--sizes", default="small,medium,large", help="comma list of corpus sizes (small,medium,large,xlarge)")
+    p.add_argument("--requests", type=int, default=32, help="requests per load scenario")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--llm-latency", type=float, default=0.5)
+    p.add_argument("--llm-jitter", type=float, default=0.1)
+    p.add_argument("--llm-per-kchar", type=float, default=0.002, help="extra seconds per 1000 prompt chars")
+    p.add_argument("--llm-failure-rate", type=float, default=0.0, help="share of calls failing with 503")
+    p.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="share of calls failing with 429")
+    p.add_argument("--scrape-latency", type=float, default=1.0)
+    p.add_argument("--scrape-failure-rate", type=float, default=0.0)
+    p.add_argument("--recordings", help="JSON of recorded Gemini responses to replay")
+    p.add_argument("--record", help="call the real Gemini API and save its responses here")
+    p.add_argument("--skip-load", action="store_true")
+    p.add_argument("--skip-micro", action="store_true")
+    p.add_argument("--out", help="result file (default: results/bench-<timestamp>.json)")
+    p.add_argument("--baseline", help="earlier result file to compare against")
+    p.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    return p.parse_args(argv)
+
+
+def configure_env():
+    """Must run before the app modules are imported: they read config at import time."""
+    os.environ["EVIDENTIA_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="evidentia-bench-"), "cache.sqlite")
+    os.environ.setdefault("YELLOWCAKE_API_KEY", "bench")
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("EVIDENTIA_NEAR_DUP", "0")  # corpus variants are unrelated texts anyway
+    os.environ.setdefault("EVIDENTIA_LLM_RPM", "100000")  # measure the app, not our own quota
+    os.environ.setdefault("EVIDENTIA_LLM_TPM", "1000000000")
+    os.environ.setdefault("EVIDENTIA_LLM_BACKOFF_BASE", "0.05")
+    sys.path.insert(0, APP_DIR)
+    sys.path.insert(0, BENCH_DIR)
+
+
+def say(*parts):
+    # The app logs every request to stdout; the harness writes past that redirect.
+    print(*parts, file=sys.__stdout__, flush=True)
+
+
+# --- LOAD ---
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list, statuses: dict, wall: float) -> dict:
+    ordered = sorted(latencies)
+    total = sum(statuses.values())
+    return {
+        "requests": total,
+        "ok": statuses.get(200, 0),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "rps": round(total / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+    }
+
+
+async def drive(client, path: str, bodies: list, concurrency: int) -> dict:
+    """POST every body to `path` with `concurrency` workers."""
+    pending = list(reversed(bodies))
+    latencies, statuses = [], {}
+
+    async def worker():
+        while pending:
+            body = pending.pop()
+            started = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+async def run_load(args, sizes: dict) -> dict:
+    import httpx
+    import fetch
+    import llm
+    import main
+    from corpus import make_policy
+    from fakes import FakeGenaiClient, FakeYellowcake, RecordingClient, load_recordings
+
+    recorder = None
+    if args.record:
+        recorder = llm.client = RecordingClient(llm.get_client(), args.record)
+    else:
+        llm.client = FakeGenaiClient(
+            latency=args.llm_latency, jitter=args.llm_jitter, per_kchar=args.llm_per_kchar,
+            failure_rate=args.llm_failure_rate, rate_limit_rate=args.llm_rate_limit_rate,
+            recordings=load_recordings(args.recordings) if args.recordings else None,
+        )
+    pages = {}
+    yellowcake = FakeYellowcake(pages, latency=args.scrape_latency, failure_rate=args.scrape_failure_rate)
+    fetch.http_client = yellowcake.client()
+
+    n = args.requests
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, size in sizes.items():
+            # Cold: every request is a different policy, so nothing is cached.
+            bodies = [{"text": make_policy(size, variant=i)} for i in range(n)]
+            results[f"analyze_text_{name}"] = await drive(client, "/api/analyze", bodies, args.concurrency)
+            print_row(f"analyze_text_{name}", results[f"analyze_text_{name}"])
+
+            # Warm: the same policies again, served from the result cache.
+            results[f"analyze_cached_{name}"] = await drive(client, "/api/analyze", bodies, args.concurrency)
+            print_row(f"analyze_cached_{name}", results[f"analyze_cached_{name}"])
+
+            urls = []
+            for i in range(n):
+                url = f"https://bench-{name}-{i}.example.com/privacy"
+                pages[url] = make_policy(size, variant=n + i)
+                urls.append(url)
+            bodies = [{"text": url} for url in urls]
+            results[f"analyze_url_{name}"] = await drive(client, "/api/analyze", bodies, args.concurrency)
+            print_row(f"analyze_url_{name}", results[f"analyze_url_{name}"])
+
+            bodies = [
+                {"textA": make_policy(size, variant=2 * n + i), "textB": make_policy(size, variant=3 * n + i)}
+                for i in range(n)
+            ]
+            results[f"compare_{name}"] = await drive(client, "/api/compare", bodies, args.concurrency)
+            print_row(f"compare_{name}", results[f"compare_{name}"])
+
+        stats = (await client.get("/api/stats")).json()
+
+    if recorder is not None:
+        recorder.save()
+        say(f"💾 Saved {len(recorder.recordings)} recorded responses to {args.record}")
+    results["_backends"] = {
+        "llm_calls": getattr(llm.client, "calls", None),
+        "llm_failures": getattr(llm.client, "failures", None),
+        "scrapes": yellowcake.calls,
+        "scheduler": stats["scheduler"],
+    }
+    return results
+
+
+# --- MICROBENCHMARKS ---
+def per_call_us(fn, repeat: int = 5) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return round(min(timer.repeat(repeat=repeat, number=number)) / number * 1e6, 2)
+
+
+def run_micro(sizes: dict) -> dict:
+    from corpus import make_policy
+    from llm import ALL_FLAG_KEYS, FLAT_FLAGS, calculate_scores, clean_noise, get_category_for_flag, passes_guardrails
+    from guardrails import scan_guardrails
+
+    findings = [
+        {"flag": k, "label": FLAT_FLAGS[k], "category": get_category_for_flag(k), "status": "true", "confidence": 1.0}
+        for k in ALL_FLAG_KEYS
+    ]
+    results = {"calculate_scores_all_flags": per_call_us(lambda: calculate_scores(findings))}
+    for name, size in sizes.items():
+        text = make_policy(size)
+        cleaned = clean_noise(text)
+        results[f"clean_noise_{name}"] = per_call_us(lambda: clean_noise(text))
+        results[f"passes_guardrails_{name}_per_flag"] = per_call_us(
+            lambda: [passes_guardrails(k, cleaned) for k in ALL_FLAG_KEYS])
+        results[f"passes_guardrails_{name}_shared_scan"] = per_call_us(
+            lambda: [passes_guardrails(k, cleaned, scan) for scan in [scan_guardrails(cleaned)] for k in ALL_FLAG_KEYS])
+    for key, value in results.items():
+        say(f"  {key:<44} {value:>12.2f} µs")
+    return results
+
+
+# --- REPORTING ---
+def print_row(name: str, row: dict):
+    say(f"  {name:<28} p50 {row['p50_ms']:>8.1f}ms  p95 {row['p95_ms']:>8.1f}ms  "
+          f"p99 {row['p99_ms']:>8.1f}ms  {row['rps']:>7.2f} rps  ok {row['ok']}/{row['requests']}")
+
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def print_baseline(current: dict, baseline: dict):
+    say(f"\n📊 Against baseline {baseline.get('started')} ({baseline.get('git')}):")
+    for name, row in current.get("load", {}).items():
+        old = baseline.get("load", {}).get(name)
+        if name.startswith("_") or not old:
+            continue
+        say(f"  {name:<28} p50 {_delta(row['p50_ms'], old['p50_ms']):>8}  "
+              f"p95 {_delta(row['p95_ms'], old['p95_ms']):>8}  rps {_delta(row['rps'], old['rps']):>8}")
+    for name, value in current.get("micro", {}).items():
+        old = baseline.get("micro", {}).get(name)
+        if old:
+            say(f"  {name:<44} {_delta(value, old):>8}")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_env()
+    from corpus import SIZES
+
+    sizes = {name: SIZES[name] for name in args.sizes.split(",")}
+    result = {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "config": vars(args),
+    }
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        if not args.skip_micro:
+            say("🔬 Microbenchmarks")
+            result["micro"] = run_micro(sizes)
+        if not args.skip_load:
+            say(f"🚚 Load: {args.requests} requests per scenario, concurrency {args.concurrency}")
+            result["load"] = asyncio.run(run_load(args, sizes))
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    say(f"\n💾 Results written to {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print_baseline(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
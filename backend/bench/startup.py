@@ -0,0 +1,105 @@
+"""
+Cold-start profile for scale-to-zero deployments.
+
+Each sample runs in a fresh interpreter, the way a new container would:
+
+    python backend/bench/startup.py                 # 5 samples, median reported
+    python backend/bench/startup.py --samples 10 --importtime
+
+Reports the time to import the app (`main`), to create the Gemini client on the
+first request, and the per-request prompt/schema/config preparation, cold (first
+request for a flag set) and warm (served from the prompts.py registry).
+--importtime adds the slowest modules from `python -X importtime`.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from run import APP_DIR, BENCH_DIR, configure_env, per_call_us
+
+
+def probe() -> dict:
+    """One cold start, measured from inside the fresh interpreter."""
+    configure_env()
+    started = time.perf_counter()
+    import main  # noqa: F401 - the import is what is being measured
+    result = {"import_main_ms": (time.perf_counter() - started) * 1000}
+    result["genai_imported_at_startup"] = "google.genai" in sys.modules
+
+    import llm
+    import prompts
+    from corpus import make_policy
+
+    started = time.perf_counter()
+    llm.get_client()
+    result["client_init_ms"] = (time.perf_counter() - started) * 1000
+
+    text = make_policy(20000)
+    keys = tuple(llm.ALL_FLAG_KEYS)
+
+    def prepare():
+        prompts.extract_config(keys)
+        prompts.build_extract_prompt(text, keys)
+
+    started = time.perf_counter()
+    prepare()
+    result["prep_cold_ms"] = (time.perf_counter() - started) * 1000
+    result["prep_warm_us"] = per_call_us(prepare)
+    return result
+
+
+def slowest_imports(limit: int) -> list:
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          cwd=APP_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda r: r["self_ms"], reverse=True)
+    return rows[:limit]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Measure Evidentia cold start and per-request preparation.")
+    p.add_argument("--samples", type=int, default=5)
+    p.add_argument("--importtime", action="store_true", help="list the slowest modules to import")
+    p.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.probe:
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull  # the app logs at import time
+            try:
+                result = probe()
+            finally:
+                sys.stdout = stdout
+        print(json.dumps(result))
+        return
+
+    samples = []
+    for _ in range(args.samples):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--probe"],
+                              cwd=BENCH_DIR, capture_output=True, text=True, check=True)
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"⏱️  Cold start, median of {len(samples)} fresh interpreters")
+    for key in ("import_main_ms", "client_init_ms", "prep_cold_ms"):
+        print(f"  {key:<28} {statistics.median(s[key] for s in samples):>10.2f} ms")
+    print(f"  {'prep_warm_us':<28} {statistics.median(s['prep_warm_us'] for s in samples):>10.2f} µs")
+    print(f"  {'genai_imported_at_startup':<28} {samples[0]['genai_imported_at_startup']!s:>10}")
+
+    if args.importtime:
+        print("\n🐢 Slowest imports (self time)")
+        for row in slowest_imports(15):
+            print(f"  {row['module']:<40} {row['self_ms']:>8.1f} ms  (cumulative {row['cumulative_ms']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
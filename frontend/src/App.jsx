@@ -57,20 +57,84 @@ Object.values(MASTER_FLAGS).forEach(category => {
   Object.assign(ALL_FLAGS_FLAT, category);
 });
 
+const BACKEND_URL = "https://evidentia.onrender.com"; 
+
+// --- LOCAL RESULT CACHE ---
+// Results are saved in localStorage under a SHA-256 of the request, together with
+// the ETag the backend sent. Asking again shows the saved copy at once and only
+// revalidates it (If-None-Match): a 304 means nothing is downloaded again.
+const CACHE_PREFIX = 'evidentia:result:';
+const CACHE_INDEX = 'evidentia:index';
+const CACHE_MAX_ENTRIES = 30;
+
+async function requestKey(path, body) {
+  const bytes = new TextEncoder().encode(path + '\n' + JSON.stringify(body));
+  const digest = await crypto.subtle.digest('SHA-256', bytes);
+  return CACHE_PREFIX + Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function readCached(key) {
+  try {
+    return JSON.parse(localStorage.getItem(key));
+  } catch {
+    return null;
+  }
+}
+
+function writeCached(key, etag, data) {
+  try {
+    const index = (JSON.parse(localStorage.getItem(CACHE_INDEX)) || []).filter(k => k !== key);
+    index.push(key);
+    while (index.length > CACHE_MAX_ENTRIES) localStorage.removeItem(index.shift());
+    localStorage.setItem(key, JSON.stringify({ etag, data }));
+    localStorage.setItem(CACHE_INDEX, JSON.stringify(index));
+  } catch {
+    // Storage full or disabled: the result just isn't kept.
+  }
+}
+
+// Compact comparisons list flag ids; the findings themselves are in reportA/reportB.
+function expandComparison(data) {
+  if (!data.comparison || !data.reportA) return data;
+  const byFlag = findings => Object.fromEntries(findings.map(f => [f.flag, f]));
+  const a = byFlag(data.reportA.findings);
+  const b = byFlag(data.reportB.findings);
+  const expand = (ids, lookup) => ids.map(id => (typeof id === 'string' ? lookup[id] || { flag: id, label: id } : id));
+  return {
+    ...data,
+    comparison: {
+      ...data.comparison,
+      common_risks: expand(data.comparison.common_risks, a),
+      unique_to_A: expand(data.comparison.unique_to_A, a),
+      unique_to_B: expand(data.comparison.unique_to_B, b),
+    },
+  };
+}
+
 // --- API HELPER (FIXED) ---
 // Replace your existing postJSON with this:
 async function postJSON(path, body, setLoading, setError, setResult) {
   setLoading(true);
   setError('');
 
-  const BACKEND_URL = "https://evidentia.onrender.com"; 
-
   try {
+    const key = await requestKey(path, body);
+    const cached = readCached(key);
+    const headers = { 'Content-Type': 'application/json' };
+    if (cached) {
+      setResult(expandComparison(cached.data));
+      if (cached.etag) headers['If-None-Match'] = cached.etag;
+    }
+
     const res = await fetch(`${BACKEND_URL}${path}`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers,
       body: JSON.stringify(body),
     });
+    if (res.status === 304 && cached) {
+      writeCached(key, cached.etag, cached.data);  // refresh its place in the index
+      return;
+    }
 
     const data = await res.json();
 
@@ -82,7 +146,8 @@ async function postJSON(path, body, setLoading, setError, setResult) {
       throw new Error(data.detail || `Request failed: ${res.status}`);
     }
 
-    setResult(data);
+    writeCached(key, res.headers.get('ETag'), data);
+    setResult(expandComparison(data));
   } catch (e) {
     setError(e.message || 'Something went wrong');
     setResult(null);
@@ -91,6 +156,101 @@ async function postJSON(path, body, setLoading, setError, setResult) {
   }
 }
 
+// --- STREAMING HELPER ---
+// Reads the Server-Sent Events from /api/analyze/stream and renders findings as
+// each shard/chunk finishes, instead of waiting for the whole report.
+const STAGE_LABELS = {
+  fetched: 'Policy text received',
+  cleaned: 'Cleaning done',
+  guardrails: 'Pre-scan done',
+  cache_hit: 'Found a saved result',
+  partial: 'Analyzing…',
+};
+
+function parseSSE(block) {
+  let event = 'message';
+  const data = [];
+  block.split('\n').forEach(line => {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+  });
+  return { event, data: data.length ? JSON.parse(data.join('\n')) : null };
+}
+
+async function postStream(path, body, setLoading, setError, setResult, setStage) {
+  setLoading(true);
+  setError('');
+  setResult(null);
+  setStage('Starting…');
+
+  const found = {};
+
+  try {
+    // Seen before: revalidate the saved report instead of streaming a new one.
+    const key = await requestKey('/api/analyze', body);
+    if (readCached(key)) {
+      setStage('');
+      return await postJSON('/api/analyze', body, setLoading, setError, setResult);
+    }
+
+    const res = await fetch(`${BACKEND_URL}${path}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+      body: JSON.stringify(body),
+    });
+
+    // Backend without streaming support: use the one-shot endpoint instead.
+    if (res.status === 404 || !res.body) {
+      setStage('');
+      return await postJSON('/api/analyze', body, setLoading, setError, setResult);
+    }
+    if (!res.ok) {
+      const data = await res.json().catch(() => ({}));
+      throw new Error(data.detail || `Request failed: ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const { event, data } = parseSSE(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+
+        if (event === 'error') {
+          throw new Error(data && data.error && data.error.includes("SITE_PROTECTED") ? "SITE_PROTECTED" : (data && data.error) || 'Something went wrong');
+        }
+        if (event === 'final') {
+          writeCached(key, null, data);  // no ETag over SSE; the next revalidation fetches one
+          setResult(data);
+          continue;
+        }
+        if (event === 'guardrails' && data.pruning) {
+          setStage(`Pre-scan done: checking ${data.pruning.candidates} flags`);
+        } else if (STAGE_LABELS[event]) {
+          setStage(STAGE_LABELS[event]);
+        }
+        if (event === 'partial') {
+          data.findings.forEach(f => { found[f.flag] = f; });
+          setResult({ findings: Object.values(found), overall_score: null, partial: true });
+        }
+      }
+    }
+  } catch (e) {
+    setError(e.message || 'Something went wrong');
+    setResult(null);
+  } finally {
+    setStage('');
+    setLoading(false);
+  }
+}
+
 // --- MAIN APP COMPONENT ---
 export default function App() {
   const [textA, setTextA] = useState('');
@@ -98,6 +258,7 @@ export default function App() {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState(null);
   const [error, setError] = useState('');
+  const [stage, setStage] = useState('');
 
   return (
     <div className="container">
@@ -138,24 +299,24 @@ export default function App() {
           value={textA}
           onChange={setTextA}
           loading={loading}
-          onAnalyze={() => postJSON('/api/analyze', { text: textA }, setLoading, setError, setResult)}
+          onAnalyze={() => postStream('/api/analyze/stream', { text: textA, include_text: true }, setLoading, setError, setResult, setStage)}
         />
         <PolicyInput
           label="Policy B"
           value={textB}
           onChange={setTextB}
           loading={loading}
-          onAnalyze={() => postJSON('/api/analyze', { text: textB }, setLoading, setError, setResult)}
+          onAnalyze={() => postStream('/api/analyze/stream', { text: textB, include_text: true }, setLoading, setError, setResult, setStage)}
         />
       </div>
 
-      {loading && <span className="loading-text">Running…</span>}
+      {loading && <span className="loading-text">{stage || 'Running…'}</span>}
 
       <div className="button-container">
         <button
           className="primary"
           disabled={loading || textA.trim().length < 10 || textB.trim().length < 10}
-          onClick={() => postJSON('/api/compare', { textA, textB }, setLoading, setError, setResult)}
+          onClick={() => postJSON('/api/compare', { textA, textB, compact: true }, setLoading, setError, setResult)}
         >
           Compare
         </button>
@@ -244,9 +405,33 @@ function ErrorNotification({ error }) {
   return <div className="error-notification"><strong>Error:</strong> {error}</div>;
 }
 
+// --- EVIDENCE HIGHLIGHT ---
+// evidence_span offsets point into analyzed_text (the cleaned policy), not the
+// pasted or fetched input, so the quote is shown highlighted in that text.
+const EXCERPT_CONTEXT = 160;
+
+function EvidenceExcerpt({ finding, text }) {
+  const span = finding.evidence_span;
+  if (!span || !text || span.end > text.length) {
+    return finding.evidence_quote ? `"${finding.evidence_quote}"` : 'Explicitly mentioned in the policy.';
+  }
+  const from = Math.max(0, span.start - EXCERPT_CONTEXT);
+  const to = Math.min(text.length, span.end + EXCERPT_CONTEXT);
+  return (
+    <span className="evidence-excerpt">
+      {from > 0 && '…'}
+      {text.slice(from, span.start)}
+      <mark>{text.slice(span.start, span.end)}</mark>
+      {text.slice(span.end, to)}
+      {to < text.length && '…'}
+    </span>
+  );
+}
+
 // --- VIEW 1: SINGLE ANALYSIS (Score Moved to Top) ---
 function SingleAnalysisView({ result }) {
-  const { findings, overall_score } = result;
+  const { findings, overall_score, partial, analyzed_text } = result;
+  const provisional = result.meta?.provisional;
 
   const findingsMap = {};
   findings.forEach(f => {
@@ -256,7 +441,10 @@ function SingleAnalysisView({ result }) {
   // Determine Score Color
   let scoreColor = '#2ecc71'; // Green
   let scoreLabel = 'Safe';
-  if (overall_score > 70) {
+  if (partial) {
+    scoreColor = '#95a5a6'; // Grey until the final score arrives
+    scoreLabel = 'Analyzing…';
+  } else if (overall_score > 70) {
     scoreColor = '#e74c3c'; // Red
     scoreLabel = 'Dangerous';
   } else if (overall_score > 30) {
@@ -271,7 +459,7 @@ function SingleAnalysisView({ result }) {
       {/* 1. SCORE HEADER (Moved Here) */}
       <div className="score-header" style={{ borderBottom: `4px solid ${scoreColor}` }}>
         <div className="score-circle" style={{ borderColor: scoreColor, color: scoreColor }}>
-          {Math.round(overall_score)}
+          {partial ? '…' : Math.round(overall_score)}
         </div>
         <div className="score-text">
           <h3 style={{ color: scoreColor }}>{scoreLabel}</h3>
@@ -279,6 +467,13 @@ function SingleAnalysisView({ result }) {
         </div>
       </div>
 
+      {provisional && (
+        <div className="error-notification">
+          <strong>Provisional:</strong> the AI model was unavailable ({provisional.reason}), so only
+          rule-based flags are shown. {provisional.undecided_flags.length} flags are not yet decided.
+        </div>
+      )}
+
       {/* 2. THE CHECKLIST */}
       <div className="checklist-container">
         {Object.entries(ALL_FLAGS_FLAT).map(([flagId, label]) => {
@@ -290,10 +485,16 @@ function SingleAnalysisView({ result }) {
           let statusText = 'Not Found';
           let description = 'No evidence of this risk was found in the text.';
 
+          if (partial && !finding) {
+            boxClass = 'box-pending';
+            statusText = 'Checking';
+            description = 'Still being analyzed…';
+          }
+
           if (isFound) {
             boxClass = 'box-red';
             statusText = 'Detected';
-            description = finding.evidence_quote ? `"${finding.evidence_quote}"` : 'Explicitly mentioned in the policy.';
+            description = <EvidenceExcerpt finding={finding} text={analyzed_text} />;
           } else if (isUnknown) {
             boxClass = 'box-yellow';
             statusText = 'Unclear';